@@ -1,9 +1,17 @@
 import os
 import time
+import threading
+from collections import deque
+
 import eventlet
 import requests
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+from requests.adapters import HTTPAdapter
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, jsonify
 from firebase_admin import auth as admin_auth
+from . import clients
+from . import profiles
+from . import summaries
+from .metrics import span
 
 auth_bp = Blueprint("auth", __name__, template_folder="templates")
 
@@ -17,8 +25,59 @@ def _timed(label):
     def done():
         dt = (time.perf_counter() - t0) * 1000
         print(f"[auth] {label} in {dt:.1f}ms")
+        return dt
     return done
 
+# One keep-alive session for Identity Toolkit: TLS + TCP setup is paid once per
+# connection, not on every login.
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=int(os.getenv("AUTH_HTTP_POOL", "10"))))
+
+# ID tokens older than this (since the user typed their password) are not
+# accepted for a new session, so a leaked token can't be replayed for long.
+TOKEN_MAX_AUTH_AGE_SEC = int(os.getenv("AUTH_TOKEN_MAX_AGE_SEC", "300"))
+
+# Recent end-to-end login latencies per path, for /_stats
+_login_ms = {"password": deque(maxlen=500), "token": deque(maxlen=500)}
+_login_lock = threading.Lock()
+
+def _record_login(path, ms):
+    with _login_lock:
+        _login_ms[path].append(ms)
+
+def login_stats():
+    out = {}
+    with _login_lock:
+        samples = {path: sorted(values) for path, values in _login_ms.items()}
+    for path, values in samples.items():
+        if not values:
+            out[path] = {"count": 0}
+            continue
+        out[path] = {
+            "count": len(values),
+            "p50_ms": round(values[len(values) // 2], 1),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+        }
+    return out
+
+def firebase_web_config():
+    """Client-side Firebase config for the token login, or None when it isn't configured."""
+    if not API_KEY:
+        return None
+    project_id = os.getenv("FIREBASE_PROJECT_ID")
+    if not project_id:
+        try:
+            project_id = clients.get("firebase_app").project_id
+        except (KeyError, ValueError):
+            return None  # FIREBASE_SERVICE_ACCOUNT_JSON missing or invalid
+    if not project_id:
+        return None
+    return {
+        "apiKey": API_KEY,
+        "authDomain": os.getenv("FIREBASE_AUTH_DOMAIN", f"{project_id}.firebaseapp.com"),
+        "projectId": project_id,
+    }
+
 def sign_in_with_password(email: str, password: str, timeout_sec: int = 8):
     """
     Firebase Identity Toolkit REST sign-in. Returns localId (uid) on success.
@@ -30,13 +89,13 @@ def sign_in_with_password(email: str, password: str, timeout_sec: int = 8):
     url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={API_KEY}"
     payload = {"email": email, "password": password, "returnSecureToken": True}
 
-    done = _timed("identitytoolkit.signInWithPassword")
-    # Hard stop if Google hangs
-    with eventlet.Timeout(timeout_sec, False):
-        r = requests.post(url, json=payload, timeout=timeout_sec)
-    if r is None:
-        raise TimeoutError("Auth timeout")
-    done()
+    r = None
+    with span("identitytoolkit", "signInWithPassword", "identitytoolkit.googleapis.com"):
+        # Hard stop if Google hangs
+        with eventlet.Timeout(timeout_sec, False):
+            r = _http.post(url, json=payload, timeout=timeout_sec)
+        if r is None:
+            raise TimeoutError("Auth timeout")
 
     if r.status_code == 200:
         data = r.json()
@@ -68,14 +127,18 @@ def signup():
         try:
             # Create the Firebase Auth user (wrap in short timeout so we don't hang)
             with eventlet.Timeout(12, False):
-                user = admin_auth.create_user(email=email, password=password)
+                user = admin_auth.create_user(email=email, password=password, app=clients.get("firebase_app"))
             if "user" not in locals():
                 return "Signup timeout, try again.", 504
 
-            get_db().collection("users").document(user.uid).set({
+            db = get_db()
+            batch = db.batch()
+            batch.set(db.collection("users").document(user.uid), {
                 "email": email,
                 "role": role,
             })
+            summaries.start(batch, db, role, user.uid)  # nothing to count yet, so it starts complete
+            batch.commit()
             flash("Account created. Please log in.", "success")
             return redirect(url_for("auth.login"))
         except Exception as e:
@@ -91,6 +154,7 @@ def login():
         if not email or not password:
             return "Email and password required.", 400
 
+        done = _timed("login (password)")
         # 1) Real auth (validates password) via REST; fast and reliable with eventlet
         try:
             uid = sign_in_with_password(email, password, timeout_sec=8)
@@ -101,30 +165,71 @@ def login():
         except Exception as e:
             return f"Auth error: {e}", 502
 
-        # 2) Load the user's role/profile from Firestore with a strict timeout
-        try:
-            with eventlet.Timeout(8, False):
-                snap = get_db().collection("users").document(uid).get()
-            if snap is None:
-                return "User data timeout.", 504
-            user_data = snap.to_dict() if snap.exists else None
-            if not user_data:
-                return "User data not found, please sign up.", 404
-        except Exception as e:
-            return f"Firestore error: {e}", 502
+        target, err = _start_session(uid, email)
+        if err:
+            return err
+        _record_login("password", done())
+        return redirect(target)
 
-        # 3) Set session and redirect
-        session["username"] = email
-        session["role"] = user_data.get("role")
-        session["uid"] = uid
+    return render_template("login.html", firebase_config=firebase_web_config())
 
-        if session["role"] == "tenant":
-            return redirect(url_for("tenant.tenant_dashboard"))
-        elif session["role"] == "landlord":
-            return redirect(url_for("landlord.dashboard_landlord"))
-        return "Unknown user role.", 400
-
-    return render_template("login.html")
+@auth_bp.route("/login/token", methods=["POST"])
+def login_token():
+    """
+    Session login from a Firebase ID token the browser got by signing in with
+    the Firebase JS SDK. The token is verified locally against Google's public
+    keys (cached by firebase_admin per their Cache-Control), so the server makes
+    no Identity Toolkit call. Returns JSON {"success", "redirect"}.
+    """
+    data = request.get_json(silent=True) or request.form
+    id_token = data.get("id_token")
+    if not id_token:
+        return jsonify({"success": False, "error": "id_token required"}), 400
+
+    done = _timed("login (token)")
+    try:
+        with span("firebase_auth", "verify_id_token"):
+            claims = admin_auth.verify_id_token(id_token, clock_skew_seconds=10,
+                                               app=clients.get("firebase_app"))
+    except (admin_auth.InvalidIdTokenError, ValueError) as e:
+        return jsonify({"success": False, "error": f"Invalid token: {e}"}), 401
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Auth error: {e}"}), 502
+
+    if time.time() - claims.get("auth_time", 0) > TOKEN_MAX_AUTH_AGE_SEC:
+        return jsonify({"success": False, "error": "Recent sign-in required"}), 401
+
+    target, err = _start_session(claims["uid"], claims.get("email", ""))
+    if err:
+        return jsonify({"success": False, "error": err[0]}), err[1]
+    _record_login("token", done())
+    return jsonify({"success": True, "redirect": target})
+
+def _start_session(uid, email):
+    """Load the profile and fill the session. Returns (redirect_url, None) or (None, (message, status))."""
+    # Load the user's role/profile (profile cache, Firestore on a miss) with a strict timeout
+    try:
+        timed_out = True
+        with eventlet.Timeout(8, False):
+            user_data = profiles.get_profile(uid)
+            timed_out = False
+        if timed_out:
+            return None, ("User data timeout.", 504)
+        if not user_data:
+            return None, ("User data not found, please sign up.", 404)
+    except Exception as e:
+        return None, (f"Firestore error: {e}", 502)
+
+    session["username"] = email
+    session["role"] = user_data.get("role")
+    session["uid"] = uid
+    profiles.remember(user_data)
+
+    if session["role"] == "tenant":
+        return url_for("tenant.tenant_dashboard"), None
+    elif session["role"] == "landlord":
+        return url_for("landlord.dashboard_landlord"), None
+    return None, ("Unknown user role.", 400)
 
 @auth_bp.route("/logout")
 def logout():
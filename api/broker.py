@@ -0,0 +1,150 @@
+"""
+Socket.IO message-queue plumbing for running more than one worker.
+
+Every worker publishes room emits to a shared message queue and relays
+what the other workers publish, so join_chat / chat_message delivery works
+no matter which worker a client is connected to. SOCKETIO_MESSAGE_QUEUE
+selects the backend:
+
+    redis://host:6379/0     Redis (needs the `redis` package)
+    amqp://...              RabbitMQ etc. via kombu
+    ipc://127.0.0.1:6380    the tiny TCP broker in this module - a local
+                            stand-in for development, tests and benchmarks
+
+Run the local broker with:  python -m api.broker --port 6380
+"""
+import json
+import socket
+import argparse
+import threading
+from urllib.parse import urlparse
+
+import eventlet
+from eventlet.queue import LightQueue, Full
+from socketio import PubSubManager
+
+
+SEND_TIMEOUT_SEC = 5.0   # a subscriber that cannot take a frame for this long is dropped
+SUBSCRIBER_BACKLOG = 10000  # frames queued for one subscriber before it is dropped as too slow
+
+
+def serve(host="127.0.0.1", port=6380):
+    """
+    Relay every newline-delimited frame from any client to all subscribers.
+
+    A client's first line says what it is: b"PUB" (only sends frames, never
+    reads) or b"SUB" (receives every frame). Each subscriber has its own
+    bounded queue and writer, so a slow or dead subscriber is dropped instead
+    of stalling delivery to the others and, through them, every publisher.
+    """
+    listener = eventlet.listen((host, port))
+    subscribers = {}  # socket -> LightQueue of frames
+    print(f"[broker] listening on {host}:{port}")
+
+    def drop(sock, reason):
+        if subscribers.pop(sock, None) is not None:
+            print(f"[broker] dropped subscriber: {reason}")
+            sock.close()
+
+    def write(sock, queue):
+        sock.settimeout(SEND_TIMEOUT_SEC)
+        try:
+            while sock in subscribers:
+                frame = queue.get()
+                if frame is None:
+                    break
+                sock.sendall(frame)
+        except OSError as e:  # socket.timeout included
+            drop(sock, e)
+
+    def relay(line):
+        for sock, queue in list(subscribers.items()):
+            try:
+                queue.put_nowait(line)
+            except Full:
+                drop(sock, f"{SUBSCRIBER_BACKLOG} frames behind")
+
+    def handle(sock):
+        reader = sock.makefile("rb")
+        try:
+            role = reader.readline().strip()
+            if role == b"SUB":
+                queue = subscribers[sock] = LightQueue(SUBSCRIBER_BACKLOG)
+                eventlet.spawn_n(write, sock, queue)
+            elif role != b"PUB":
+                if role:  # empty: a port probe that connected and closed
+                    print(f"[broker] closing client with unknown role {role[:20]!r}")
+                return
+            for line in reader:
+                if line.endswith(b"\n"):  # not a frame cut off by a publisher's send timeout
+                    relay(line)
+        except OSError:
+            pass
+        finally:
+            queue = subscribers.pop(sock, None)
+            if queue is not None and not queue.full():
+                queue.put_nowait(None)  # wake its writer so it exits
+            sock.close()
+
+    while True:
+        sock, _ = listener.accept()
+        eventlet.spawn_n(handle, sock)
+
+
+class IPCManager(PubSubManager):
+    """Socket.IO client manager backed by the local broker (ipc://host:port)."""
+
+    name = "ipc"
+
+    def __init__(self, url="ipc://127.0.0.1:6380", channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or "127.0.0.1", parsed.port or 6380)
+        self._pub = None
+        self._pub_lock = threading.Lock()
+
+    def _publish(self, data):
+        frame = (json.dumps({"channel": self.channel, "data": data}) + "\n").encode()
+        with self._pub_lock:
+            for attempt in range(2):
+                try:
+                    if self._pub is None:
+                        self._pub = socket.create_connection(self.address, timeout=SEND_TIMEOUT_SEC)
+                        self._pub.sendall(b"PUB\n")
+                    self._pub.sendall(frame)
+                    return
+                except OSError:
+                    self._pub = None
+                    if attempt:
+                        raise
+
+    def _listen(self):
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+                sock.sendall(b"SUB\n")
+                for line in sock.makefile("rb"):
+                    message = json.loads(line)
+                    if message.get("channel") == self.channel:
+                        yield message["data"]
+            except OSError as e:
+                self._get_logger().error(f"ipc broker connection lost: {e}")
+                eventlet.sleep(1)
+
+
+def socketio_queue_options(url):
+    """Extra SocketIO(...) kwargs for the message queue at url (empty = single process)."""
+    if not url:
+        return {}
+    if url.startswith("ipc://"):
+        return {"client_manager": IPCManager(url)}
+    return {"message_queue": url}
+
+
+if __name__ == "__main__":
+    eventlet.monkey_patch()
+    parser = argparse.ArgumentParser(description="Local Socket.IO message broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,208 @@
+"""
+Small caching primitives shared by the app.
+
+TTLCache    - bounded LRU with per-entry expiry, optionally backed by a
+              persistent store (FirestoreStore, DiskStore) for a second tier
+SingleFlight - coalesces concurrent calls for the same key into one call
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from eventlet.event import Event
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=3600, store=None, name="cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.name = name
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+
+        if self.store is not None:
+            try:
+                loaded = self.store.load(key)
+            except Exception as e:
+                print(f"[{self.name}] store load failed: {e}")
+                loaded = None
+            if loaded is not None and loaded[1] > now:
+                self._put(key, loaded[0], loaded[1])
+                with self._lock:
+                    self.store_hits += 1
+                    self.hits += 1
+                return loaded[0]
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        self._put(key, value, expires_at)
+        if self.store is not None:
+            try:
+                self.store.save(key, value, expires_at)
+            except Exception as e:
+                print(f"[{self.name}] store save failed: {e}")
+
+    def _put(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if self.store is not None:
+            try:
+                self.store.delete(key)
+            except Exception as e:
+                print(f"[{self.name}] store delete failed: {e}")
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "store_hits": self.store_hits,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class FirestoreStore:
+    """Persistent tier for TTLCache: one doc per key in `collection`."""
+
+    def __init__(self, db, collection):
+        self.db = db
+        self.collection = collection
+
+    def _ref(self, key):
+        return self.db.collection(self.collection).document(hashlib.sha256(key.encode()).hexdigest()[:40])
+
+    def load(self, key):
+        snap = self._ref(key).get()
+        if not snap.exists:
+            return None
+        data = snap.to_dict()
+        return data.get("value"), data.get("expires_at", 0)
+
+    def save(self, key, value, expires_at):
+        self._ref(key).set({"key": key, "value": value, "expires_at": expires_at})
+
+    def delete(self, key):
+        self._ref(key).delete()
+
+
+class DiskStore:
+    """Persistent tier for TTLCache: one JSON file per key under `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".json")
+
+    def load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return data.get("value"), data.get("expires_at", 0)
+
+    def save(self, key, value, expires_at):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "value": value, "expires_at": expires_at}, f)
+        os.replace(tmp, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SingleFlight:
+    """Concurrent do(key, ...) calls share one execution and its result (or exception)."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = Event()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if not leader:
+            return call.wait()
+
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            # eventlet.Timeout is a BaseException; followers must not wait forever on it
+            call.send_exception(e if isinstance(e, Exception) else RuntimeError("single-flight call interrupted"))
+            raise
+        else:
+            call.send(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+def cached_call(cache, flight, key, fn, *args):
+    """Return cache[key], computing it once via fn(*args) (coalesced) on a miss."""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    def compute():
+        value = fn(*args)
+        cache.set(key, value)
+        return value
+
+    return flight.do(key, compute)
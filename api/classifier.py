@@ -0,0 +1,194 @@
+"""
+House-problem classifier backends.
+
+RemoteClassifier   - hosted Roboflow model (network round-trip per image)
+LocalClassifier    - ONNX model on CPU, loaded and warmed once at startup;
+                     concurrent requests are micro-batched into one run
+FallbackClassifier - tries the primary backend, uses the fallback on error
+
+All backends take JPEG bytes (see imaging.prepare_for_inference) and return
+{"label", "confidence", "backend"}. build_classifier() picks one from env:
+
+    CLASSIFIER_BACKEND     remote (default) | local | auto (local, remote fallback)
+    CLASSIFIER_MODEL_PATH  .onnx file for the local backend
+    CLASSIFIER_LABELS      comma-separated class names, or a path to a file with one per line
+    CLASSIFIER_NORMALIZE   unit (pixels / 255, default) | imagenet
+"""
+import io
+import os
+import time
+import base64
+import threading
+
+import eventlet
+from eventlet import tpool
+from eventlet.event import Event
+from eventlet.queue import LightQueue, Empty
+
+from .metrics import span
+
+MODEL_ID = "classification-house-problems/1"
+
+_IMAGENET_MEAN = (0.485, 0.456, 0.406)
+_IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class RemoteClassifier:
+    name = "remote"
+
+    def __init__(self, client, model_id=MODEL_ID):
+        self.client = client
+        self.model_id = model_id
+
+    def classify(self, jpeg):
+        with span("roboflow", "infer", self.model_id):
+            prediction = self.client.infer(base64.b64encode(jpeg).decode("ascii"), model_id=self.model_id)
+        top = (prediction.get("predictions") or [{}])[0]
+        return {"label": top.get("class", "Unknown"), "confidence": top.get("confidence"), "backend": self.name}
+
+
+class LocalClassifier:
+    name = "local"
+
+    def __init__(self, model_path, labels, normalize="unit", max_batch=8, batch_window_ms=5):
+        try:
+            import numpy as np
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("local classifier needs numpy and onnxruntime installed") from e
+        self._np = np
+        self.labels = labels
+        self.normalize = normalize
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000.0
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # NCHW; fall back to 224 when the model has dynamic spatial dims
+        h, w = model_input.shape[2:4]
+        self.input_size = (w if isinstance(w, int) else 224, h if isinstance(h, int) else 224)
+        self.batched = not isinstance(model_input.shape[0], int) or model_input.shape[0] != 1
+
+        self._queue = LightQueue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.images = 0
+        self._warm_up()
+
+    def _warm_up(self):
+        t0 = time.perf_counter()
+        dummy = self._np.zeros((1, 3, self.input_size[1], self.input_size[0]), dtype=self._np.float32)
+        self.session.run(None, {self.input_name: dummy})
+        print(f"[classifier] local model warm in {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+    def _preprocess(self, jpeg):
+        from PIL import Image
+
+        np = self._np
+        img = Image.open(io.BytesIO(jpeg))
+        img.draft("RGB", self.input_size)
+        img = img.convert("RGB").resize(self.input_size, Image.BILINEAR)
+        arr = np.asarray(img, dtype=np.float32) / 255.0
+        if self.normalize == "imagenet":
+            arr = (arr - np.array(_IMAGENET_MEAN, dtype=np.float32)) / np.array(_IMAGENET_STD, dtype=np.float32)
+        return arr.transpose(2, 0, 1)  # HWC -> CHW
+
+    def classify(self, jpeg):
+        arr = self._preprocess(jpeg)
+        with self._lock:
+            if self._worker is None:
+                self._worker = eventlet.spawn(self._run)
+        done = Event()
+        self._queue.put((arr, done))
+        return done.wait()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            if self.batched:
+                deadline = time.monotonic() + self.batch_window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except Empty:
+                        break
+                groups = [batch]
+            else:
+                groups = [[item] for item in batch]
+
+            for group in groups:
+                try:
+                    results = self._infer([arr for arr, _ in group])
+                except Exception as e:
+                    for _, done in group:
+                        done.send_exception(e)
+                    continue
+                for (_, done), result in zip(group, results):
+                    done.send(result)
+
+    def _infer(self, arrays):
+        np = self._np
+        inputs = np.stack(arrays).astype(np.float32)
+        # onnxruntime releases the GIL; run it on a real thread so the hub keeps serving
+        with span("onnx", "run", f"batch{len(arrays)}"):
+            logits = tpool.execute(self.session.run, None, {self.input_name: inputs})[0]
+        self.batches += 1
+        self.images += len(arrays)
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs = exp / exp.sum(axis=1, keepdims=True)
+        results = []
+        for row in probs:
+            idx = int(row.argmax())
+            label = self.labels[idx] if idx < len(self.labels) else "Unknown"
+            results.append({"label": label, "confidence": float(row[idx]), "backend": self.name})
+        return results
+
+
+class FallbackClassifier:
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.fallbacks = 0
+
+    def classify(self, jpeg):
+        try:
+            return self.primary.classify(jpeg)
+        except Exception as e:
+            self.fallbacks += 1
+            print(f"[classifier] {self.primary.name} failed, using {self.fallback.name}: {e}")
+            return self.fallback.classify(jpeg)
+
+
+def _load_labels(spec):
+    if spec and os.path.isfile(spec):
+        with open(spec) as f:
+            return [line.strip() for line in f if line.strip()]
+    return [s.strip() for s in (spec or "").split(",") if s.strip()]
+
+
+def build_classifier(rf_client):
+    backend = os.getenv("CLASSIFIER_BACKEND", "remote").lower()
+    remote = RemoteClassifier(rf_client)
+    if backend == "remote":
+        return remote
+
+    try:
+        local = LocalClassifier(
+            os.environ["CLASSIFIER_MODEL_PATH"],
+            _load_labels(os.getenv("CLASSIFIER_LABELS")),
+            normalize=os.getenv("CLASSIFIER_NORMALIZE", "unit"),
+        )
+    except Exception as e:
+        if backend == "local":
+            raise
+        print(f"[classifier] local backend unavailable, using remote: {e}")
+        return remote
+    return local if backend == "local" else FallbackClassifier(local, remote)
@@ -0,0 +1,77 @@
+"""
+Classification result cache.
+
+Exact tier: labels keyed by the SHA-256 of the uploaded bytes (bounded LRU
+with TTL, optionally persisted to disk). Near-duplicate tier: a bounded
+in-memory index of perceptual hashes, so a re-encoded or resized copy of a
+photo we already classified also skips the network call.
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .cache import TTLCache, DiskStore
+
+
+class ClassificationCache:
+    def __init__(self, maxsize=1024, ttl=7 * 24 * 3600, disk_dir=None, max_distance=4):
+        store = DiskStore(disk_dir) if disk_dir else None
+        self.exact = TTLCache(maxsize=maxsize, ttl=ttl, store=store, name="classify-cache")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance  # Hamming distance on 64-bit dHash; 0 disables
+        self._near = OrderedDict()  # phash -> (expires_at, label)
+        self._lock = threading.Lock()
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_key(raw):
+        return hashlib.sha256(raw).hexdigest()
+
+    def get_exact(self, key):
+        return self.exact.get(key)
+
+    def get_near(self, phash):
+        if not self.max_distance or phash is None:
+            return None
+        now = time.time()
+        best = None
+        with self._lock:
+            for other, (expires_at, label) in self._near.items():
+                if expires_at <= now:
+                    continue
+                distance = (phash ^ other).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, other, label)
+            if best is not None:
+                self._near.move_to_end(best[1])
+                self.near_hits += 1
+                return best[2]
+        return None
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, phash, label):
+        self.exact.set(key, label)
+        if self.max_distance and phash is not None:
+            with self._lock:
+                self._near[phash] = (time.time() + self.ttl, label)
+                self._near.move_to_end(phash)
+                while len(self._near) > self.maxsize:
+                    self._near.popitem(last=False)
+
+    def stats(self):
+        exact = self.exact.stats()
+        lookups = exact["hits"] + self.near_hits + self.misses
+        return {
+            "exact_hits": exact["hits"],
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((exact["hits"] + self.near_hits) / lookups, 3) if lookups else 0.0,
+            "size": exact["size"],
+            "near_index_size": len(self._near),
+        }
@@ -0,0 +1,108 @@
+"""
+Shared external clients, built on first use.
+
+Each client is built the first time something uses it and then shared by
+every module, so importing the app (a serverless cold start) pays only for
+the clients its first requests actually need:
+
+    firebase_app   firebase_admin app from FIREBASE_SERVICE_ACCOUNT_JSON
+    firestore      Firestore client, instrumented for /metrics
+    genai          google-genai client (GEMINI_API_KEY)
+    roboflow       Roboflow InferenceHTTPClient (ROBOFLOW_API_KEY)
+
+get(name) returns the client. lazy(name) is a stand-in for module globals
+such as index.db that builds it on first attribute access. provide(name,
+client) installs a ready-made client instead (benchmarks install fakes).
+"""
+import os
+import json
+import time
+import threading
+
+from . import metrics
+
+_builders = {}
+_clients = {}
+_build_ms = {}
+_requested = set()  # builds attempted, including ones that failed
+_lock = threading.RLock()  # re-entrant: building firestore builds firebase_app
+
+
+def _builder(name):
+    def register(fn):
+        _builders[name] = fn
+        return fn
+    return register
+
+
+@_builder("firebase_app")
+def _firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    cred = credentials.Certificate(json.loads(os.environ["FIREBASE_SERVICE_ACCOUNT_JSON"]))
+    return firebase_admin.initialize_app(cred)
+
+
+@_builder("firestore")
+def _firestore():
+    from firebase_admin import firestore
+
+    db = firestore.client(app=get("firebase_app"))
+    metrics.instrument_firestore()  # every Firestore RPC becomes a span on /metrics
+    return db
+
+
+@_builder("genai")
+def _genai():
+    from google import genai
+
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+@_builder("roboflow")
+def _roboflow():
+    from inference_sdk import InferenceHTTPClient
+
+    return InferenceHTTPClient(api_url="https://serverless.roboflow.com", api_key=os.getenv("ROBOFLOW_API_KEY"))
+
+
+def get(name):
+    if name in _clients:
+        return _clients[name]
+    with _lock:
+        if name not in _clients:
+            _requested.add(name)
+            t0 = time.perf_counter()
+            _clients[name] = _builders[name]()
+            _build_ms[name] = round((time.perf_counter() - t0) * 1000, 1)
+            print(f"[clients] {name} ready in {_build_ms[name]}ms")
+        return _clients[name]
+
+
+def provide(name, client):
+    with _lock:
+        _clients[name] = client
+
+
+class _Lazy:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get(self._name), attr)
+
+    def __repr__(self):
+        state = "ready" if self._name in _clients else "not built yet"
+        return f"<lazy {self._name} client, {state}>"
+
+
+def lazy(name):
+    """Proxy for the `name` client; building it is deferred until it is first used."""
+    if name not in _builders:
+        raise KeyError(name)
+    return _Lazy(name)
+
+
+def stats():
+    return {"built": sorted(_clients), "requested": sorted(_requested), "build_ms": dict(_build_ms)}
@@ -0,0 +1,43 @@
+"""
+The statutory deadline scheduler (api/deadlines.py) as a process of its own.
+
+Web workers don't run the scheduler. Run exactly one of these per deployment:
+
+    python -m api.deadline_worker            # long-running; sleeps until the next deadline
+    python -m api.deadline_worker --once     # fire what is due now and exit (cron, e.g. every minute)
+
+It loads the app for index.deadline_reached, so Socket.IO events reach users
+through SOCKETIO_MESSAGE_QUEUE (without one there is nobody connected here
+to receive them and only the emails go out).
+"""
+import eventlet
+eventlet.monkey_patch()  # before anything else imports socket/threading
+
+import os
+import time
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m api.deadline_worker", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--once", action="store_true", help="fire everything due now, then exit")
+    args = parser.parse_args(argv)
+
+    os.environ["DEADLINES"] = "0"  # importing the app must not start a second scheduler
+    from . import index, deadlines
+    from .mailer import get_mailer
+
+    scheduler = deadlines.DeadlineScheduler(index.db, index.deadline_reached)
+    if args.once:
+        t0 = time.perf_counter()
+        due = scheduler.run_once()
+        get_mailer().flush()
+        print(f"[deadlines] {due} due, {scheduler.stats()['fired']} fired, {scheduler.failed} failed "
+              f"in {(time.perf_counter() - t0) * 1000:.0f}ms")
+        return 1 if scheduler.failed else 0
+    print("[deadlines] scheduler running")
+    scheduler.start().wait()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
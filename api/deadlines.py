@@ -0,0 +1,274 @@
+"""
+Statutory deadline scheduler.
+
+An issue's `days` (set when its letter is generated) gives it a due date,
+created_at + days. fields() turns that into what is stored on the issue:
+
+    due_at            the due date
+    deadline_stage    the next notification: "due_soon" (REMIND_BEFORE_SEC
+                      before due_at) or "overdue" (at due_at); afterwards
+                      "escalated"
+    deadline_next_at  when that notification fires; removed once the last one
+                      has fired or the issue is resolved
+
+summaries._change_issue() writes these in the same transaction as the days
+or status change. Only open issues with a notification ahead carry
+deadline_next_at, so a range query on it reads the issues coming due and
+nothing else, however many issues exist (see firestore.indexes.json).
+
+DeadlineScheduler keeps the issues due within HORIZON_SEC in a heap and
+sleeps until the earliest one. Every RELOAD_SEC it re-runs the range query
+for `deadline_next_at <= now + HORIZON_SEC`, which also picks up anything
+that came due while the process was down. Firing claims the issue in a
+transaction (its deadline_next_at must still be the one scheduled) and moves
+it to its next stage before `notify` runs, so a restart, a stale heap entry
+or a second worker never sends the same notification twice.
+
+One scheduler per deployment is enough, and every extra one pays for the
+same loads and claim transactions, so web workers don't start one: run
+api/deadline_worker.py (long-running, or --once from cron) instead.
+DEADLINES=1 makes init() start one in the calling process.
+"""
+import os
+import time
+import heapq
+import datetime
+import threading
+
+import eventlet
+from eventlet.queue import LightQueue, Empty
+from firebase_admin import firestore
+
+HORIZON_SEC = float(os.getenv("DEADLINE_HORIZON_SEC", "900"))
+RELOAD_SEC = float(os.getenv("DEADLINE_RELOAD_SEC", "60"))
+REMIND_BEFORE_SEC = float(os.getenv("DEADLINE_REMIND_BEFORE_SEC", str(24 * 3600)))
+LOAD_LIMIT = int(os.getenv("DEADLINE_LOAD_LIMIT", "1000"))
+CONCURRENCY = int(os.getenv("DEADLINE_CONCURRENCY", "8"))
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def due_at(issue):
+    """created_at + days, or None when the issue has no (positive) statutory period yet."""
+    created = issue.get("created_at")
+    if not isinstance(created, datetime.datetime):
+        created = _utcnow() if created is firestore.SERVER_TIMESTAMP else None
+    days = issue.get("days")
+    if created is None or not isinstance(days, (int, float)) or days <= 0:
+        return None
+    return created + datetime.timedelta(days=days)
+
+
+def fields(issue, now=None):
+    """The deadline fields to write with an issue change that sets its days or status."""
+    due = due_at(issue)
+    if due is None or issue.get("status") == "resolved":
+        return {"deadline_stage": firestore.DELETE_FIELD, "deadline_next_at": firestore.DELETE_FIELD}
+    remind = due - datetime.timedelta(seconds=REMIND_BEFORE_SEC)
+    stage, when = ("due_soon", remind) if remind > (now or _utcnow()) else ("overdue", due)
+    return {"due_at": due, "deadline_stage": stage, "deadline_next_at": when}
+
+
+def _claim(transaction, ref, expected_at):
+    """Advance the issue past the stage due at `expected_at`. Returns (stage, issue), or None if stale."""
+    snap = ref.get(transaction=transaction)
+    issue = snap.to_dict() if snap.exists else None
+    if issue is None or issue.get("status") == "resolved" or issue.get("deadline_next_at") != expected_at:
+        return None
+    stage = issue.get("deadline_stage")
+    if stage == "due_soon" and issue.get("due_at"):
+        changes = {"deadline_stage": "overdue", "deadline_next_at": issue["due_at"],
+                   "reminded_at": firestore.SERVER_TIMESTAMP}
+    else:
+        stage = "overdue"
+        changes = {"deadline_stage": "escalated", "deadline_next_at": firestore.DELETE_FIELD,
+                   "escalated_at": firestore.SERVER_TIMESTAMP}
+    transaction.update(ref, changes)
+    return stage, issue
+
+
+class DeadlineScheduler:
+    """
+    notify(stage, issue_id, issue) is called once per fired stage, on a green
+    thread of its own. `clock` returns aware UTC datetimes (benchmarks pass a
+    simulated one and drive load()/tick() themselves instead of start()).
+    """
+
+    def __init__(self, db, notify, horizon=HORIZON_SEC, reload_every=RELOAD_SEC, limit=LOAD_LIMIT,
+                 concurrency=CONCURRENCY, clock=_utcnow):
+        self.db = db
+        self.notify = notify
+        self.horizon = datetime.timedelta(seconds=horizon)
+        self.reload_every = reload_every
+        self.limit = limit
+        self.clock = clock
+        self._heap = []       # (when, issue_id); entries that no longer match _scheduled are skipped
+        self._scheduled = {}  # issue_id -> when
+        self._loaded_until = None
+        self._backlog = False  # the last load hit `limit`; load again as soon as the heap drains
+        self._wake = LightQueue()
+        self._pool = eventlet.GreenPool(concurrency)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.loads = 0
+        self.docs_loaded = 0
+        self.fired = {"due_soon": 0, "overdue": 0}
+        self.stale = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+        return self
+
+    def wait(self):
+        """Block until the scheduler's loop ends (it doesn't, short of an error)."""
+        return self._thread.wait()
+
+    def run_once(self, now=None):
+        """Load and fire everything due by `now`, then return how many were due (for cron-driven runs)."""
+        now = now or self.clock()
+        due = 0
+        while True:
+            failed, fired = self.failed, sum(self.fired.values())
+            self.load(now, until=now)  # no horizon: anything later is the next run's
+            due += self.tick(now, wait=True)
+            # A full page means more may be due. Stop on failures (the next run retries them) and on a
+            # pass that fired nothing, so a page of stale issues can't keep this loading forever
+            if not self._backlog or self.failed > failed or sum(self.fired.values()) == fired:
+                return due
+
+    def schedule(self, issue_id, when):
+        """Note a deadline this process just wrote, so it need not wait for the next load."""
+        if not isinstance(when, datetime.datetime):
+            return
+        with self._lock:
+            if self._loaded_until is None or when > self._loaded_until:
+                return  # the load that covers it will find it
+            self._push(issue_id, when)
+        if self._thread is not None:
+            self._wake.put(None)  # only the start() loop waits on it
+
+    def _push(self, issue_id, when):
+        if self._scheduled.get(issue_id) != when:
+            self._scheduled[issue_id] = when
+            heapq.heappush(self._heap, (when, issue_id))
+
+    def load(self, now=None, until=None):
+        """Read every issue due up to `until` (now + horizon) into the heap. Returns how many were read."""
+        now = now or self.clock()
+        until = until or now + self.horizon
+        docs = (self.db.collection("issues")
+                .where("deadline_next_at", "<=", until)
+                .order_by("deadline_next_at")
+                .limit(self.limit)
+                .get())
+        with self._lock:
+            for doc in docs:
+                when = (doc.to_dict() or {}).get("deadline_next_at")
+                if isinstance(when, datetime.datetime):
+                    self._push(doc.id, when)
+            # A full page may stop short of `until`; the next load continues from there
+            self._backlog = len(docs) >= self.limit
+            self._loaded_until = docs[-1].to_dict()["deadline_next_at"] if self._backlog else until
+        self.loads += 1
+        self.docs_loaded += len(docs)
+        return len(docs)
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, issue_id = heapq.heappop(self._heap)
+                if self._scheduled.get(issue_id) == when:
+                    del self._scheduled[issue_id]
+                    due.append((issue_id, when))
+        return due
+
+    def tick(self, now=None, wait=False):
+        """Fire everything due by `now`. Returns how many issues were due."""
+        due = self._pop_due(now or self.clock())
+        for issue_id, when in due:
+            self._pool.spawn_n(self._fire, issue_id, when)
+        if wait:
+            self._pool.waitall()
+        return len(due)
+
+    def _fire(self, issue_id, when):
+        ref = self.db.collection("issues").document(issue_id)
+        try:
+            claimed = firestore.transactional(_claim)(self.db.transaction(), ref, when)
+        except Exception as e:
+            self.failed += 1  # deadline_next_at is unchanged, so the next load retries it
+            print(f"[deadlines] claiming {issue_id} failed: {e}")
+            return
+        if claimed is None:
+            self.stale += 1  # resolved, rescheduled or already handled elsewhere
+            return
+        stage, issue = claimed
+        self.fired[stage] += 1
+        if stage == "due_soon":
+            self.schedule(issue_id, issue.get("due_at"))
+        try:
+            self.notify(stage, issue_id, issue)
+        except Exception as e:
+            print(f"[deadlines] notifying {stage} for {issue_id} failed: {e}")
+
+    def _seconds_to_next(self):
+        with self._lock:
+            if not self._heap:
+                return None
+            return (self._heap[0][0] - self.clock()).total_seconds()
+
+    def _run(self):
+        next_load = 0.0
+        while True:
+            if time.monotonic() >= next_load:
+                try:
+                    self.load()
+                except Exception as e:
+                    print(f"[deadlines] load failed: {e}")
+                next_load = time.monotonic() + self.reload_every
+            self.tick()
+            if self._backlog and not self._heap:
+                next_load = time.monotonic()
+            delay = next_load - time.monotonic()
+            to_next = self._seconds_to_next()
+            if to_next is not None:
+                delay = min(delay, to_next)
+            try:
+                self._wake.get(timeout=max(delay, 0.0))
+            except Empty:
+                pass
+
+    def stats(self):
+        with self._lock:
+            next_due = self._heap[0][0] if self._heap else None
+            pending = len(self._scheduled)
+        return {
+            "pending": pending,
+            "next_due": next_due.isoformat() if next_due else None,
+            "loads": self.loads,
+            "docs_loaded": self.docs_loaded,
+            "fired": dict(self.fired),
+            "stale": self.stale,
+            "failed": self.failed,
+        }
+
+
+_scheduler = None
+
+
+def init(db, notify):
+    """Start the process-wide scheduler, only with DEADLINES=1 (see api/deadline_worker.py)."""
+    global _scheduler
+    if os.getenv("DEADLINES", "0") == "1":
+        _scheduler = DeadlineScheduler(db, notify).start()
+    return _scheduler
+
+
+def get_scheduler():
+    return _scheduler
@@ -3,36 +3,30 @@ eventlet.monkey_patch()  # MUST be first
 
 import os
 import sys
-import json
+import atexit
 import datetime
-import tempfile
+import hashlib
 import time
 
-from google import genai
 from dotenv import load_dotenv
 from flask import Flask, jsonify, request, session, redirect, url_for, g
 from flask_socketio import SocketIO, join_room, emit
-import firebase_admin
-from firebase_admin import credentials, firestore as firestore_admin
-# If you keep using inference_sdk, leave this import; otherwise you can remove and use requests instead.
-from inference_sdk import InferenceHTTPClient
+from werkzeug.exceptions import RequestEntityTooLarge
+from firebase_admin import firestore as firestore_admin
 
 # Make parent folder importable (so blueprints at repo root work when this file is under /api)
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-load_dotenv()
-
-# --- Firebase Admin / Firestore (REST transport to avoid gRPC stalls in eventlet) ---
-sa_json = os.environ["FIREBASE_SERVICE_ACCOUNT_JSON"]
-sa = json.loads(sa_json)
-cred = credentials.Certificate(sa)
-firebase_admin.initialize_app(cred)
-
+from .broker import socketio_queue_options
+from . import clients
+from . import metrics
+from .metrics import span
 
-db = firestore_admin.client()
+load_dotenv()
 
-# --- Env & Gemini ---
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# --- Firestore / Gemini: built on first use (api/clients.py), so importing this module stays cheap ---
+db = clients.lazy("firestore")
+client = clients.lazy("genai")
 
 # --- Flask / Socket.IO ---
 app = Flask(
@@ -47,9 +41,13 @@ socketio = SocketIO(
     async_mode="eventlet",
     cors_allowed_origins=[o.strip() for o in os.getenv("SOCKETIO_CORS", "*").split(",") if o.strip()],
     ping_interval=25,   # seconds between client pings
-    ping_timeout=60     # time to wait for pong before disconnect
+    ping_timeout=60,    # time to wait for pong before disconnect
+    # shared queue so rooms span workers (redis://, amqp://, or ipc:// for the local broker)
+    **socketio_queue_options(os.getenv("SOCKETIO_MESSAGE_QUEUE")),
 )
 
+metrics.init_app(app)  # /metrics, request histogram, optional Server-Timing
+
 # --- simple health check ---
 @app.get("/_ping")
 def _ping():
@@ -64,19 +62,90 @@ def _start_timer():
 def _log_timing(resp):
     try:
         dt = (time.perf_counter() - g._t0) * 1000
-        print(f"{request.method} {request.path} -> {resp.status_code} in {dt:.1f}ms")
+        reads = ""
+        if "loader" in g and g.loader.timings:
+            reads = " [" + " ".join(f"{k}={v:.1f}ms" for k, v in g.loader.timings.items()) + "]"
+        calls = ""
+        if g.get("_spans"):
+            calls = " {" + " ".join(f"{k}={t * 1000:.1f}ms/{n}" for k, (t, n) in g._spans.items()) + "}"
+        print(f"{request.method} {request.path} -> {resp.status_code} in {dt:.1f}ms{reads}{calls}")
     except Exception:
         pass
     return resp
 
 # --- Roboflow ---
-rf_client = InferenceHTTPClient(
-    api_url="https://serverless.roboflow.com",
-    api_key=os.getenv("ROBOFLOW_API_KEY"),
+rf_client = clients.lazy("roboflow")
+RF_INPUT_SIZE = int(os.getenv("RF_INPUT_SIZE", "640"))  # longest side sent to the classifier
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 64 * 1024  # room for multipart framing
+
+from .classifier import build_classifier
+from .imaging import read_upload, prepare_for_inference, perceptual_hash, ImageTooLarge
+from .classify_cache import ClassificationCache
+
+classifier = build_classifier(rf_client)  # remote Roboflow unless CLASSIFIER_BACKEND says otherwise
+
+classify_cache = ClassificationCache(
+    maxsize=int(os.getenv("CLASSIFY_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("CLASSIFY_CACHE_TTL_SEC", str(7 * 24 * 3600))),
+    disk_dir=os.getenv("CLASSIFY_CACHE_DIR") or None,  # optional on-disk tier
+    max_distance=int(os.getenv("CLASSIFY_PHASH_DISTANCE", "4")),  # 0 = exact matches only
 )
 
+# --- Chat persistence: write-behind queue + retention (both off the socket handler) ---
+from .retention import RetentionEngine
+from .message_writer import MessageWriter
+from .room_cache import build_room_cache
+from .mailer import get_mailer, build_message
+from . import profiles
+from . import reports
+from . import summaries
+from . import deadlines
+
+retention = RetentionEngine(db)
+
+
+def _on_messages_flushed(counts):
+    for chat_id, n in counts.items():
+        room_cache.committed(chat_id)  # only now will other workers' re-reads include the messages
+        retention.record(chat_id, n)
+
+
+message_writer = MessageWriter(db, on_flushed=_on_messages_flushed)
+atexit.register(message_writer.flush)
+
+# Newest messages of active rooms, served by load_chat without a Firestore read
+room_cache = build_room_cache()
+
+
+def _collect_stats():
+    return {
+        "chat_writer": message_writer.stats(),
+        "room_cache": room_cache.stats(),
+        "advice_cache": advice_cache.stats(),
+        "days_cache": days_cache.stats(),
+        "ai_coalesced": ai_flight.coalesced,
+        "issue_jobs": issue_jobs.stats(),
+        "classify_cache": classify_cache.stats(),
+        "mailer": get_mailer().stats(),
+        "profiles": profiles.stats(),
+        "logins": login_stats(),
+        "report_cache": reports.stats(),
+        "deadlines": deadline_scheduler.stats() if deadline_scheduler else None,
+        "clients": clients.stats(),
+    }
+
+
+@app.get("/_stats")
+@metrics.require_token
+def _stats():
+    return jsonify(_collect_stats())
+
+
+metrics.register_collector(_collect_stats)  # /_stats counters also appear on /metrics
+
 # --- Blueprints ---
-from .auth import auth_bp
+from .auth import auth_bp, login_stats
 from .tenant import tenant_bp
 from .landlord import landlord_bp
 from .profilepage import profile_bp
@@ -98,55 +167,335 @@ def chat():
     return redirect(url_for("auth.login"))
 
 
-def get_ai_advice_from_label(user, state, label):
-    try:
-        prompt = (
-            f"Act as a legal expert in housing and tenant rights.\n\n"
-            f"Create a formal legal complaint letter that a tenant named '{user}' "
-            f"living in the state of '{state}' can send to their landlord.\n\n"
-            f"The complaint is about the following issue: '{label}'.\n\n"
-            f"The letter should:\n"
-            f"- Mention relevant state-specific tenant rights and repair laws (for {state})\n"
-            f"- Formally demand that the landlord fixes the issue\n"
-            f"- Specify a reasonable time frame for repair (e.g., 7 days)\n"
-            f"- Clearly state possible legal consequences (such as withholding rent, "
-            f"  small claims court, health department complaints) if the landlord fails to act\n"
-            f"- Be written in a formal, professional tone\n"
-            f"- Assume the tenant wants to stay polite but firm\n\n"
-            f"Output the complete legal letter ready to be copied and sent."
-        )
+# --- Gemini: cached + single-flight ---
+from .cache import TTLCache, FirestoreStore, SingleFlight, cached_call
+from .jobs import JobQueue
+
+# Bump PROMPT_VERSION whenever a prompt changes so old cached answers are not reused.
+PROMPT_VERSION = "v1"
+GEMINI_MODEL = "gemini-2.0-flash"
+TENANT_PLACEHOLDER = "[TENANT_NAME]"
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+_ai_store = FirestoreStore(db, "ai_cache") if os.getenv("AI_CACHE_PERSIST", "1") == "1" else None
+advice_cache = TTLCache(maxsize=int(os.getenv("AI_CACHE_SIZE", "256")), ttl=AI_CACHE_TTL,
+                        store=_ai_store, name="advice-cache")
+days_cache = TTLCache(maxsize=int(os.getenv("AI_CACHE_SIZE", "256")), ttl=AI_CACHE_TTL,
+                      store=_ai_store, name="days-cache")
+ai_flight = SingleFlight()
+
+
+def _ai_key(kind, state, label):
+    return f"{kind}:{PROMPT_VERSION}:{state.strip().lower()}:{label.strip().lower()}"
+
+
+def _advice_prompt(state, label):
+    return (
+        f"Act as a legal expert in housing and tenant rights.\n\n"
+        f"Create a formal legal complaint letter that a tenant named '{TENANT_PLACEHOLDER}' "
+        f"living in the state of '{state}' can send to their landlord.\n\n"
+        f"The complaint is about the following issue: '{label}'.\n\n"
+        f"The letter should:\n"
+        f"- Mention relevant state-specific tenant rights and repair laws (for {state})\n"
+        f"- Formally demand that the landlord fixes the issue\n"
+        f"- Specify a reasonable time frame for repair (e.g., 7 days)\n"
+        f"- Clearly state possible legal consequences (such as withholding rent, "
+        f"  small claims court, health department complaints) if the landlord fails to act\n"
+        f"- Be written in a formal, professional tone\n"
+        f"- Assume the tenant wants to stay polite but firm\n"
+        f"- Use the exact text {TENANT_PLACEHOLDER} wherever the tenant's name appears\n\n"
+        f"Output the complete legal letter ready to be copied and sent."
+    )
+
+
+def _generate_advice_template(state, label):
+    """Letter body for (state, label) with TENANT_PLACEHOLDER where the tenant's name goes."""
+    with span("gemini", "generate_content", GEMINI_MODEL):
         response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[{"text": prompt}],
+            model=GEMINI_MODEL,
+            contents=[{"text": _advice_prompt(state, label)}],
         )
-        return response.text.strip()
-    except Exception as e:
-        print(f"Gemini API error: {e}")
-        return "Unable to generate advice at the moment."
+    return response.text.strip()
 
 
-def get_ai_days_from_label(state, label):
-    try:
-        prompt = (
-            "Act as a legal expert specializing in housing and tenant rights. "
-            "I need you to determine the statutory period—the number of days a landlord has to fix an issue "
-            "in a rented living space before a tenant can file a legal claim—based on state law."
-            f"State: {state} Issue: {label}"
-            "Please provide: "
-            "1. The specific number of days (or the range of days) the law grants for the landlord "
-            "to address this issue before a legal claim can be filed."
-            "Output the answer AS ONE INTEGER NOTHING MORE NOTHING LESS"
+class GenerationCancelled(Exception):
+    pass
+
+
+def _stream_advice_template(state, label, on_text, cancelled):
+    """
+    Like _generate_advice_template, but streamed: on_text(delta) is called per
+    chunk as Gemini produces it. Stops (and closes the stream) with
+    GenerationCancelled once cancelled() is true. Returns (template, ttft_ms).
+    """
+    t0 = time.perf_counter()
+    ttft_ms = None
+    parts = []
+    with span("gemini", "generate_content_stream", GEMINI_MODEL):
+        stream = client.models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=[{"text": _advice_prompt(state, label)}],
         )
+        try:
+            for chunk in stream:
+                if cancelled():
+                    raise GenerationCancelled()
+                text = chunk.text or ""
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+                    metrics.observe_call("gemini", "first_token", GEMINI_MODEL, ttft_ms / 1000)
+                parts.append(text)
+                on_text(text)
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+    return "".join(parts).strip(), ttft_ms
+
+
+def _generate_days(state, label):
+    prompt = (
+        "Act as a legal expert specializing in housing and tenant rights. "
+        "I need you to determine the statutory period—the number of days a landlord has to fix an issue "
+        "in a rented living space before a tenant can file a legal claim—based on state law."
+        f"State: {state} Issue: {label}"
+        "Please provide: "
+        "1. The specific number of days (or the range of days) the law grants for the landlord "
+        "to address this issue before a legal claim can be filed."
+        "Output the answer AS ONE INTEGER NOTHING MORE NOTHING LESS"
+    )
+    with span("gemini", "generate_content", GEMINI_MODEL):
         response = client.models.generate_content(
-            model="gemini-2.0-flash",
+            model=GEMINI_MODEL,
             contents=[{"text": prompt}],
         )
-        return int(response.text.strip())
+    return int(response.text.strip())
+
+
+def _advice_for(user, state, label):
+    """The cached letter for (state, label) with the tenant's name filled in. Raises on failure (the job retries)."""
+    template = cached_call(advice_cache, ai_flight, _ai_key("advice", state, label),
+                           _generate_advice_template, state, label)
+    return template.replace(TENANT_PLACEHOLDER, user)
+
+
+def get_ai_days_from_label(state, label):
+    try:
+        return cached_call(days_cache, ai_flight, _ai_key("days", state, label),
+                           _generate_days, state, label)
     except Exception as e:
         print(f"Gemini API error: {e}")
         return 7  # safe default
 
 
+# --- Issue AI pipeline: /addIssue returns at once, the letter is generated in the background ---
+# With AI_STREAMING on, a letter that is not cached is streamed to the tenant's
+# room as "issue_advice_chunk" events while Gemini writes it. If the tenant has
+# no socket left for AI_STREAM_CANCEL_GRACE_SEC (page reloads reconnect well
+# within that), the generation is cancelled and the issue marked failed, so
+# it can be retried from the dashboard.
+# Socket counts and streams are per worker. With a shared message queue the
+# tenant may reconnect to another worker inside the grace period, which this
+# worker cannot see, so cancelling is off there unless AI_STREAM_CANCEL=1.
+AI_STREAMING = os.getenv("AI_STREAMING", "1") == "1"
+AI_STREAM_CANCEL = os.getenv("AI_STREAM_CANCEL", "0" if os.getenv("SOCKETIO_MESSAGE_QUEUE") else "1") == "1"
+AI_STREAM_CANCEL_GRACE_SEC = float(os.getenv("AI_STREAM_CANCEL_GRACE_SEC", "10"))
+_open_sockets = {}     # uid -> connected Socket.IO clients on this worker
+_streaming = {}        # uid -> issue ids whose letter this worker is streaming
+_cancelled_issues = set()  # issue ids; only ever this worker's own streams
+
+
+def _user_room(uid):
+    return f"user:{uid}"
+
+
+def _placeholder_prefix_len(text):
+    """Length of the longest tail of text that could be the start of a split TENANT_PLACEHOLDER."""
+    for k in range(min(len(TENANT_PLACEHOLDER) - 1, len(text)), 0, -1):
+        if text.endswith(TENANT_PLACEHOLDER[:k]):
+            return k
+    return 0
+
+
+class _AdviceStream:
+    """Pushes letter deltas to the tenant with the placeholder already filled in."""
+
+    def __init__(self, issue_id, tenant, user):
+        self.issue_id = issue_id
+        self.room = _user_room(tenant)
+        self.user = user
+        self.pending = ""
+        self.seq = 0
+
+    def feed(self, text):
+        self.pending += text
+        hold = _placeholder_prefix_len(self.pending)
+        ready, self.pending = self.pending[:len(self.pending) - hold], self.pending[len(self.pending) - hold:]
+        self._emit(ready)
+
+    def close(self):
+        self._emit(self.pending)
+        self.pending = ""
+
+    def _emit(self, text):
+        if not text:
+            return
+        self.seq += 1
+        socketio.emit("issue_advice_chunk", {
+            "issue_id": self.issue_id,
+            "seq": self.seq,
+            "text": text.replace(TENANT_PLACEHOLDER, self.user),
+        }, room=self.room)
+
+
+def _streamed_advice(job):
+    """
+    (advice, ttft_ms): from the cache, or streamed to the tenant while it is
+    generated. (None, None) if the tenant went away and the stream was cancelled.
+    """
+    p = job.payload
+    key = _ai_key("advice", p["state"], p["label"])
+    template = advice_cache.get(key)
+    if template is not None:
+        return template.replace(TENANT_PLACEHOLDER, p["username"]), None
+
+    stream = _AdviceStream(p["issue_id"], p["tenant"], p["username"])
+    cancelled = lambda: p["issue_id"] in _cancelled_issues  # noqa: E731
+
+    def generate():
+        template, ttft_ms = _stream_advice_template(p["state"], p["label"], stream.feed, cancelled)
+        advice_cache.set(key, template)
+        return template, ttft_ms
+
+    try:
+        # Concurrent misses for the same letter share the leader's generation (only the leader streams)
+        template, ttft_ms = ai_flight.do(key, generate)
+    except GenerationCancelled:
+        if cancelled():
+            return None, None
+        raise RuntimeError("shared generation was cancelled by another tenant")  # retried as normal
+    stream.close()
+    return template.replace(TENANT_PLACEHOLDER, p["username"]), ttft_ms
+
+
+def _generate_issue_ai(job):
+    p = job.payload
+    _streaming.setdefault(p["tenant"], set()).add(p["issue_id"])
+    try:
+        with job.stage("ai"):
+            # Cache lookups when warm; on a miss the two Gemini calls overlap.
+            if AI_STREAMING:
+                advice_call = eventlet.spawn(_streamed_advice, job)
+            else:
+                advice_call = eventlet.spawn(lambda: (_advice_for(p["username"], p["state"], p["label"]), None))
+            num_days = get_ai_days_from_label(p["state"], p["label"])
+            ai_advice, ttft_ms = advice_call.wait()
+            if ai_advice is None:
+                raise GenerationCancelled()
+    except GenerationCancelled:
+        print(f"[issue-ai] generation for {p['issue_id']} cancelled, tenant disconnected")
+        summaries.update_issue(db, db.collection("issues").document(p["issue_id"]),
+                               {"status": "failed", "error": "cancelled"})
+        socketio.emit(
+            "issue_update",
+            {"issue_id": p["issue_id"], "status": "failed", "label": p["label"], "error": "cancelled"},
+            room=_user_room(p["tenant"]),
+        )
+        return
+    finally:
+        active = _streaming.get(p["tenant"], set())
+        active.discard(p["issue_id"])
+        if not active:
+            _streaming.pop(p["tenant"], None)
+        _cancelled_issues.discard(p["issue_id"])
+    if ttft_ms is not None:
+        job.stages["ai_first_token"] = ttft_ms
+        print(f"[issue-ai] {p['issue_id']} first token {ttft_ms:.0f}ms, generated in {job.stages['ai']:.0f}ms")
+    with job.stage("persist"):
+        changes = {"status": "pending", "ai_advice": ai_advice, "days": num_days, "error": None}
+        before = summaries.update_issue(db, db.collection("issues").document(p["issue_id"]), changes)
+    if before is not None and deadline_scheduler is not None:
+        deadline_scheduler.schedule(p["issue_id"], deadlines.fields({**before, **changes}).get("deadline_next_at"))
+    socketio.emit(
+        "issue_update",
+        {"issue_id": p["issue_id"], "status": "pending", "label": p["label"], "days": num_days,
+         "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+         "generation_ms": round(job.stages["ai"], 1)},
+        room=_user_room(p["tenant"]),
+    )
+
+
+def _issue_job_dead(job):
+    p = job.payload
+    summaries.update_issue(db, db.collection("issues").document(p["issue_id"]), {
+        "status": "failed",
+        "error": str(job.error),
+    })
+    socketio.emit(
+        "issue_update",
+        {"issue_id": p["issue_id"], "status": "failed", "label": p["label"]},
+        room=_user_room(p["tenant"]),
+    )
+
+
+# --- Statutory deadlines: reminder before due_at, escalation to the landlord once it passes ---
+MAIL_FROM = os.getenv("MAIL_FROM") or os.getenv("GMAIL_USER", "")
+
+
+def _user_email(uid):
+    snap = db.collection("users").document(uid).get() if uid else None
+    user = snap.to_dict() if snap is not None and snap.exists else {}
+    return user.get("email") or user.get("username")
+
+
+def deadline_reached(stage, issue_id, issue):
+    """DeadlineScheduler's notify: a Socket.IO event and emails for the stage that just fired."""
+    due = issue.get("due_at")
+    label = issue.get("label") or "Your issue"
+    event = {"issue_id": issue_id, "stage": stage, "label": issue.get("label"),
+             "due_at": due.isoformat() if isinstance(due, datetime.datetime) else None}
+    due_text = due.strftime("%d %B %Y") if isinstance(due, datetime.datetime) else "soon"
+    tenant, landlord = issue.get("tenant"), issue.get("landlord_uid")
+    socketio.emit("issue_deadline", event, room=_user_room(tenant))
+    mailer = get_mailer()
+    if stage == "due_soon":
+        to = _user_email(tenant)
+        if to:
+            mailer.send(build_message(MAIL_FROM, to, f"Deadline approaching: {label}",
+                                      f"The statutory period for \"{label}\" ends on {due_text}. "
+                                      "Log in to your dashboard to follow up or mark it resolved."))
+        return
+    if landlord:
+        socketio.emit("issue_deadline", {**event, "tenant": tenant}, room=_user_room(landlord))
+    for uid, body in ((tenant, f"The statutory period for \"{label}\" ended on {due_text} and the issue "
+                               "is still open. Your legal report is available from your dashboard."),
+                      (landlord, f"A tenant's issue \"{label}\" passed its statutory deadline on {due_text} "
+                                 "without being resolved. Log in to your dashboard for details.")):
+        to = _user_email(uid)
+        if to:
+            mailer.send(build_message(MAIL_FROM, to, f"Overdue: {label}", body))
+    print(f"[deadlines] {issue_id} ({label}) is overdue, escalated to landlord {landlord}")
+
+
+deadline_scheduler = deadlines.init(db, deadline_reached)  # None unless DEADLINES=1
+
+
+issue_jobs = JobQueue(
+    "issue-ai",
+    _generate_issue_ai,
+    concurrency=int(os.getenv("ISSUE_JOB_CONCURRENCY", "4")),
+    max_retries=int(os.getenv("ISSUE_JOB_RETRIES", "3")),
+    backoff_sec=float(os.getenv("ISSUE_JOB_BACKOFF_SEC", "2")),
+    on_dead=_issue_job_dead,
+)
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def _too_large(e):
+    return jsonify({"success": False, "error": f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit"}), 413
+
+
 @app.route("/upload_image", methods=["POST"])
 def upload_image():
     chat_id = request.args.get("chat_id")
@@ -156,36 +505,57 @@ def upload_image():
 
     file = request.files["file"]
 
-    # Use a guaranteed-writable temp location in serverless environments
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        file.save(tmp.name)
-        temp_path = tmp.name
+    # Everything stays in memory: read, downscale to the model input size, send as base64 JPEG
+    try:
+        raw = read_upload(file, MAX_UPLOAD_BYTES)
+        content_key = ClassificationCache.content_key(raw)
+        label = classify_cache.get_exact(content_key)
+        if label is not None:
+            return jsonify({"success": True, "label": label, "cached": "exact",
+                            "metrics": {"bytes_in": len(raw), "bytes_sent": 0}})
+        jpeg, upload_metrics = prepare_for_inference(raw, max_side=RF_INPUT_SIZE)
+    except ImageTooLarge as e:
+        return jsonify({"success": False, "error": str(e)}), 413
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Invalid image: {e}"}), 400
 
     try:
-        prediction = rf_client.infer(temp_path, model_id="classification-house-problems/1")
-        label = prediction.get("predictions", [{}])[0].get("class", "Unknown")
+        phash = perceptual_hash(jpeg)
+    except Exception:
+        phash = None
+    label = classify_cache.get_near(phash)
+    if label is not None:
+        upload_metrics["bytes_sent"] = 0
+        return jsonify({"success": True, "label": label, "cached": "near", "metrics": upload_metrics})
+    classify_cache.miss()
+
+    try:
+        t0 = time.perf_counter()
+        prediction = classifier.classify(jpeg)
+        upload_metrics["infer_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        upload_metrics["backend"] = prediction["backend"]
+        label = prediction["label"]
+        if label != "Unknown":
+            classify_cache.put(content_key, phash, label)
 
         # Pull any needed session fields (optional)
         _current_user = session.get("username")
         _state = session.get("state")
 
-        return jsonify({"success": True, "label": label})
+        print(f"[upload_image] {upload_metrics}")
+        return jsonify({"success": True, "label": label, "metrics": upload_metrics})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
-    finally:
-        try:
-            os.remove(temp_path)
-        except Exception:
-            pass
 
 
 @app.route("/addIssue", methods=["POST"])
 def add_issue():
     """
     Expects a JSON payload with a key 'label'. Retrieves the current user's uid from the session,
-    fetches additional user details (e.g. state) from Firestore, and uses the data along with the label
-    to generate legal advice using get_ai_advice_from_label. The resulting advice is stored with the
-    issue along with tenant and status.
+    fetches additional user details (e.g. state) from Firestore and creates the issue right away with
+    status "generating". The legal advice and statutory days are produced by the issue-ai job queue,
+    which flips the status to "pending" (or "failed") and notifies the tenant over Socket.IO
+    ("issue_update"). Clients without a socket can poll /issues/<issue_id>/status.
     """
     try:
         data = request.get_json(force=True)
@@ -198,52 +568,230 @@ def add_issue():
         if not current_user:
             return jsonify({"success": False, "error": "User not logged in"}), 400
 
-        user_doc = db.collection("users").document(current_user).get()
-        if not user_doc.exists:
+        user_data = profiles.session_profile()
+        if not user_data.get("role"):
             return jsonify({"success": False, "error": "User data not found"}), 404
 
-        user_data = user_doc.to_dict()
         state = user_data.get("state")
-        username = user_data.get("username", current_user)
+        username = user_data.get("username") or current_user
 
         if not state:
             return jsonify({"success": False, "error": "User state not found"}), 400
 
-        ai_advice = get_ai_advice_from_label(username, state, label)
-        num_days = get_ai_days_from_label(state, label)
-
-        issue_data = {
+        issue_ref = db.collection("issues").document()
+        summaries.create_issue(db, issue_ref, {
             "label": label,
             "tenant": current_user,
-            "status": "pending",
-            "ai_advice": ai_advice,
-            "days": num_days,
+            "landlord_uid": user_data.get("landlord_uid"),  # lets the landlord's summary count it
+            "status": "generating",
+            "ai_advice": None,
+            "days": None,
             "created_at": firestore_admin.SERVER_TIMESTAMP,  # keep SERVER_TIMESTAMP from admin SDK
-        }
+        })
 
-        db.collection("issues").add(issue_data)
+        queued = issue_jobs.submit({
+            "issue_id": issue_ref.id,
+            "tenant": current_user,
+            "username": username,
+            "state": state,
+            "label": label,
+        })
+        if not queued:
+            summaries.update_issue(db, issue_ref, {"status": "failed", "error": "Generation queue is full"})
+            return jsonify({"success": False, "error": "Server busy, please retry", "issue_id": issue_ref.id}), 503
 
-        return jsonify({"success": True, "label": label, "tenant": current_user}), 200
+        return jsonify({
+            "success": True,
+            "label": label,
+            "tenant": current_user,
+            "issue_id": issue_ref.id,
+            "status": "generating",
+        }), 202
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def _own_issue(issue_id):
+    """(issue_ref, issue_data) if the session user owns the issue, else an error response tuple."""
+    current_user = session.get("uid")
+    if not current_user:
+        return None, (jsonify({"success": False, "error": "User not logged in"}), 401)
+    issue_ref = db.collection("issues").document(issue_id)
+    snap = issue_ref.get()
+    if not snap.exists:
+        return None, (jsonify({"success": False, "error": "Issue not found"}), 404)
+    issue_data = snap.to_dict()
+    if issue_data.get("tenant") != current_user:
+        return None, (jsonify({"success": False, "error": "Not authorized"}), 403)
+    return (issue_ref, issue_data), None
+
+
+@app.get("/issues/<issue_id>/status")
+def issue_status(issue_id):
+    found, err = _own_issue(issue_id)
+    if err:
+        return err
+    _, issue_data = found
+    return jsonify({
+        "success": True,
+        "issue_id": issue_id,
+        "status": issue_data.get("status"),
+        "label": issue_data.get("label"),
+        "days": issue_data.get("days"),
+        "has_advice": bool(issue_data.get("ai_advice")),
+        "error": issue_data.get("error"),
+    })
+
+
+@app.post("/issues/<issue_id>/retry")
+def retry_issue(issue_id):
+    """Re-queue AI generation for an issue that landed in the dead-letter ("failed") state."""
+    found, err = _own_issue(issue_id)
+    if err:
+        return err
+    issue_ref, issue_data = found
+    if issue_data.get("status") != "failed":
+        return jsonify({"success": False, "error": "Issue is not in a failed state"}), 409
+
+    user_data = profiles.get_profile(issue_data["tenant"]) or {}
+    state = user_data.get("state")
+    if not state:
+        return jsonify({"success": False, "error": "User state not found"}), 400
+
+    summaries.update_issue(db, issue_ref, {"status": "generating", "error": None})
+    queued = issue_jobs.submit({
+        "issue_id": issue_id,
+        "tenant": issue_data["tenant"],
+        "username": user_data.get("username", issue_data["tenant"]),
+        "state": state,
+        "label": issue_data.get("label"),
+    })
+    if not queued:
+        summaries.update_issue(db, issue_ref, {"status": "failed", "error": "Generation queue is full"})
+        return jsonify({"success": False, "error": "Server busy, please retry"}), 503
+    return jsonify({"success": True, "issue_id": issue_id, "status": "generating"}), 202
+
+
+CHAT_PAGE_DEFAULT = 10
+CHAT_PAGE_MAX = 50
+
+
+def _parse_cursor(value):
+    """"<timestamp>|<message id>" -> (datetime, id). A bare timestamp (older clients) gives id ""."""
+    stamp, _, message_id = value.partition("|")
+    ts = datetime.datetime.fromisoformat(stamp)
+    return ts if ts.tzinfo else ts.replace(tzinfo=datetime.timezone.utc), message_id
+
+
+def _cursor(message):
+    return f"{message['timestamp']}|{message['id']}"
+
+
+def _after(query, cursor, descending=False):
+    """Order by (timestamp, document id) and start after `cursor`, so equal timestamps never straddle a page."""
+    ts, message_id = cursor
+    direction = firestore_admin.Query.DESCENDING if descending else firestore_admin.Query.ASCENDING
+    query = query.order_by("timestamp", direction=direction).order_by("__name__", direction=direction)
+    return query.start_after({"timestamp": ts, "__name__": message_id} if message_id else {"timestamp": ts})
+
+
+def _message_json(doc):
+    message = doc.to_dict()
+    message["id"] = doc.id
+    ts = message.get("timestamp")
+    if hasattr(ts, "isoformat"):
+        message["timestamp"] = ts.isoformat()
+    return message
+
+
 @app.route("/load_chat/<chat_id>")
 def load_chat(chat_id):
+    """
+    Chat history, oldest first.
+      ?limit=N          page size (default 10, max 50)
+      ?before=<cursor>  messages older than the cursor ("load earlier")
+      ?since=<cursor>   messages newer than the cursor (catch-up after a reconnect)
+    Cursors are "<timestamp>|<message id>", as returned in next_cursor / latest;
+    the id breaks ties between messages sent in the same instant.
+    Responses carry an ETag; a matching If-None-Match gets a 304 with no body.
+    """
     try:
+        limit = max(1, min(int(request.args.get("limit", CHAT_PAGE_DEFAULT)), CHAT_PAGE_MAX))
+        before = request.args.get("before")
+        since = request.args.get("since") or request.args.get("after")
+
         messages_ref = db.collection("chats").document(chat_id).collection("messages")
-        messages_query = (
-            messages_ref.order_by("timestamp", direction=firestore_admin.Query.DESCENDING)
-            .limit(10)
-            .get()   # WAS: .stream() -> change to .get() for eager fetch under eventlet
-        )
-        messages = [doc.to_dict() for doc in messages_query]
-        messages.reverse()
-        return jsonify({"messages": messages})
+        if since:
+            cursor = _parse_cursor(since)
+            messages = room_cache.since(chat_id, cursor, limit)
+            if messages is None:
+                docs = _after(messages_ref, cursor).limit(limit).get()
+                messages = [_message_json(doc) for doc in docs]
+        elif before:
+            docs = _after(messages_ref, _parse_cursor(before), descending=True).limit(limit).get()
+            messages = [_message_json(doc) for doc in docs]
+            messages.reverse()
+        else:
+            messages = room_cache.latest(chat_id, limit)
+            if messages is None:
+                docs = (
+                    messages_ref.order_by("timestamp", direction=firestore_admin.Query.DESCENDING)
+                    .order_by("__name__", direction=firestore_admin.Query.DESCENDING)
+                    .limit(limit)
+                    .get()   # WAS: .stream() -> change to .get() for eager fetch under eventlet
+                )
+                messages = [_message_json(doc) for doc in docs]
+                messages.reverse()
+                room_cache.fill(chat_id, messages, exhausted=len(messages) < limit)
+                messages = room_cache.latest(chat_id, limit) or messages
+    except ValueError as e:
+        return jsonify({"messages": [], "error": f"Bad query parameter: {e}"}), 400
     except Exception as e:
         return jsonify({"messages": [], "error": str(e)})
 
+    has_more = len(messages) == limit
+    resp = jsonify({
+        "messages": messages,
+        # pass as ?before= to page further back (None when this was the oldest page)
+        "next_cursor": _cursor(messages[0]) if messages and has_more and not since else None,
+        # pass as ?since= to fetch only what arrived after this response
+        "latest": _cursor(messages[-1]) if messages else since,
+        "has_more": has_more,
+    })
+    tag = hashlib.sha1(
+        "|".join([chat_id, before or "", since or ""] + [f"{m['id']}@{m.get('timestamp')}" for m in messages]).encode()
+    ).hexdigest()
+    resp.set_etag(tag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
+
+
+@socketio.on("connect")
+def on_connect():
+    # Per-user room for server pushes (issue_update, ...)
+    uid = session.get("uid")
+    if uid:
+        join_room(_user_room(uid))
+        _open_sockets[uid] = _open_sockets.get(uid, 0) + 1
+
+
+def _cancel_if_gone(uid):
+    if _open_sockets.get(uid, 0) == 0:
+        _cancelled_issues.update(_streaming.get(uid, ()))
+
+
+@socketio.on("disconnect")
+def on_disconnect(*args):
+    uid = session.get("uid")
+    if not uid or uid not in _open_sockets:
+        return
+    _open_sockets[uid] -= 1
+    if _open_sockets[uid] <= 0:
+        _open_sockets.pop(uid, None)
+        if AI_STREAM_CANCEL and _streaming.get(uid):
+            eventlet.spawn_after(AI_STREAM_CANCEL_GRACE_SEC, _cancel_if_gone, uid)
+
 
 @socketio.on("join_chat")
 def join_chat(data):
@@ -263,13 +811,18 @@ def handle_send_chat_message(data):
     message = data.get("message")
     msg_type = data.get("type", "text")
 
-    live_timestamp = datetime.datetime.utcnow().isoformat()
+    # One timestamp for both the live copy and the stored copy: the write is
+    # batched later, so SERVER_TIMESTAMP would reflect flush time, not send time.
+    sent_at = datetime.datetime.now(datetime.timezone.utc)
+    # Auto-ids are generated client-side, so the id is known before the write lands
+    message_id = db.collection("chats").document(chat_id).collection("messages").document().id
 
     live_message_data = {
+        "id": message_id,
         "sender": sender,
         "message": message,
         "type": msg_type,
-        "timestamp": live_timestamp,
+        "timestamp": sent_at.isoformat(),
         "chat_id": chat_id,
     }
 
@@ -277,22 +830,14 @@ def handle_send_chat_message(data):
         "sender": sender,
         "message": message,
         "type": msg_type,
-        "timestamp": firestore_admin.SERVER_TIMESTAMP,
+        "timestamp": sent_at,
         "chat_id": chat_id,
     }
 
-    db.collection("chats").document(chat_id).collection("messages").add(store_message_data)
     emit("chat_message", live_message_data, room=chat_id)
-    enforce_message_limit(chat_id)
-
-
-def enforce_message_limit(chat_id, limit=10):
-    messages_ref = db.collection("chats").document(chat_id).collection("messages")
-    messages = list(messages_ref.order_by("timestamp").get())  # WAS: .stream()
-    if len(messages) > limit:
-        num_to_delete = len(messages) - limit
-        for i in range(num_to_delete):
-            messages[i].reference.delete()
+    room_cache.append(chat_id, live_message_data)
+    if not message_writer.enqueue(chat_id, store_message_data, message_id):
+        message_writer.write_now(chat_id, store_message_data, message_id)
 
 
 if __name__ == "__main__":
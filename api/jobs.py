@@ -0,0 +1,132 @@
+"""
+Background job queue on eventlet green threads.
+
+Jobs are submitted to a bounded in-memory queue and run by up to
+`concurrency` workers. A failing job is retried with exponential backoff;
+once it runs out of attempts it is handed to `on_dead` (dead-letter).
+Handlers time their own stages with `with job.stage("name"):` and the
+queue aggregates those timings in stats().
+"""
+import time
+import threading
+import contextlib
+
+import eventlet
+from eventlet.queue import LightQueue, Full
+
+
+class Job:
+    def __init__(self, payload):
+        self.payload = payload
+        self.attempts = 0
+        self.stages = {}
+        self.submitted_at = time.monotonic()
+        self.error = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (time.perf_counter() - t0) * 1000
+
+
+class JobQueue:
+    def __init__(self, name, handler, concurrency=4, max_retries=3, backoff_sec=1.0,
+                 max_queue=1000, on_dead=None):
+        self.name = name
+        self.handler = handler      # handler(job) -> None, raises to trigger a retry
+        self.on_dead = on_dead      # on_dead(job) after the last failed attempt
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_sec = backoff_sec
+        self.max_queue = max_queue
+
+        self._queue = LightQueue(max_queue)
+        self._workers = []
+        self._lock = threading.Lock()
+        self._started_at = None
+
+        self.submitted = 0
+        self.completed = 0
+        self.dead = 0
+        self.retries = 0
+        self.running = 0
+        self._latency_ms = {}  # stage -> [count, total, max]
+
+    def start(self):
+        if not self._workers:
+            self._started_at = time.monotonic()
+            self._workers = [eventlet.spawn(self._work) for _ in range(self.concurrency)]
+
+    def submit(self, payload):
+        """Queue a job; returns False when the queue is full."""
+        self.start()
+        try:
+            self._queue.put_nowait(Job(payload))
+        except Full:
+            return False
+        self.submitted += 1
+        return True
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self.running += 1
+            try:
+                self._process(job)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    def _process(self, job):
+        job.stages["queue_wait"] = (time.monotonic() - job.submitted_at) * 1000
+        while True:
+            job.attempts += 1
+            try:
+                self.handler(job)
+            except Exception as e:
+                job.error = e
+                if job.attempts > self.max_retries:
+                    self.dead += 1
+                    print(f"[{self.name}] job dead after {job.attempts} attempts: {e}")
+                    if self.on_dead:
+                        try:
+                            self.on_dead(job)
+                        except Exception as dead_err:
+                            print(f"[{self.name}] on_dead failed: {dead_err}")
+                    return
+                self.retries += 1
+                eventlet.sleep(self.backoff_sec * (2 ** (job.attempts - 1)))
+                continue
+
+            self.completed += 1
+            job.stages["total"] = (time.monotonic() - job.submitted_at) * 1000
+            self._record(job.stages)
+            return
+
+    def _record(self, stages):
+        with self._lock:
+            for name, ms in stages.items():
+                agg = self._latency_ms.setdefault(name, [0, 0.0, 0.0])
+                agg[0] += 1
+                agg[1] += ms
+                agg[2] = max(agg[2], ms)
+
+    def stats(self):
+        uptime = time.monotonic() - self._started_at if self._started_at else 0
+        return {
+            "queue_depth": self._queue.qsize(),
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dead": self.dead,
+            "retries": self.retries,
+            "throughput_per_min": round(self.completed / uptime * 60, 2) if uptime else 0.0,
+            "latency_ms": {
+                name: {"avg": round(total / count, 1), "max": round(mx, 1), "count": count}
+                for name, (count, total, mx) in self._latency_ms.items()
+            },
+        }
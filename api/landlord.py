@@ -1,41 +1,112 @@
-from flask import Blueprint, render_template, redirect, url_for, session, flash, request, current_app
-import smtplib, os
-from email.mime.text import MIMEText
+import os
+import re
+import csv
+import io
+import time
+
+from flask import Blueprint, render_template, redirect, url_for, session, flash, request, current_app, jsonify
 from firebase_admin import auth, firestore  # keep auth; reuse db from index.py
+from .queries import fetch_where_in, set_in_batches, to_doc
+from .loader import get_loader
+from .mailer import get_mailer, build_message
+from . import reports
+from . import summaries
 
 landlord_bp = Blueprint("landlord", __name__, template_folder="templates")
 
 def get_db():
     return current_app.config["DB"]
 
-@landlord_bp.route("/landlord/dashboard")
-def dashboard_landlord():
-    if "username" in session and session.get("role") == "landlord":
-        landlord_uid = session.get("uid")
+def _invitation_email(landlord_email, tenant_email):
+    return build_message(
+        landlord_email,
+        tenant_email,
+        "Request from your Landlord",
+        "You have received a request from your landlord. Please log in to your dashboard to view the request.",
+    )
 
-        tenants_ref = get_db().collection("users").document(landlord_uid).collection("tenants")
-        tenants_docs = tenants_ref.get()  # REST .get() instead of .stream()
-        tenants = []
-        for doc in tenants_docs:
-            t = doc.to_dict()
-            t["uid"] = doc.id
-            tenants.append(t)
+BULK_INVITE_MAX = int(os.getenv("BULK_INVITE_MAX", "5000"))
+_EMAIL_RE = re.compile(r"^[^@\s,;]+@[^@\s,;]+\.[^@\s,;]+$")
 
-        selected_tenant_email = request.args.get("tenant_email")
+def _bulk_emails():
+    """Raw email strings from a JSON body, a CSV upload and/or a textarea, in order."""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        emails = data.get("emails", data) if isinstance(data, dict) else data
+        return [str(e) for e in emails] if isinstance(emails, list) else []
 
-        landlord_issues = []
-        for tenant in tenants:
-            issues_query = get_db().collection("issues").where("tenant", "==", tenant["uid"]).get()
-            for doc in issues_query:
-                issue = doc.to_dict()
-                issue["id"] = doc.id
-                issue["tenant_email"] = tenant.get("email")
-                landlord_issues.append(issue)
+    raw = []
+    upload = request.files.get("csv_file")
+    if upload and upload.filename:
+        text = upload.read().decode("utf-8-sig", errors="replace")
+        for row in csv.reader(io.StringIO(text)):
+            raw.extend(cell for cell in row if "@" in cell)  # any column, header rows drop out
+    raw.extend(re.split(r"[\s,;]+", request.form.get("tenant_emails", "")))
+    return [e for e in raw if e.strip()]
 
+def _landlord_dashboard_state(landlord_uid, selected_email=None):
+    """
+    {"tenants", "issues", "summary"}: the landlord's summary document plus the
+    selected tenant's issues. Until the summary is complete (see
+    summaries.complete), every tenant's issues are read instead and there is
+    no summary.
+    """
+    db = get_db()
+    load = get_loader()
+    summary = load.doc_dict("summaries", f"landlord:{landlord_uid}")
+    if summaries.complete(summary):
+        view = summaries.for_dashboard(db, "landlord", landlord_uid, summary)
+        tenants = [{"id": uid, **t} for uid, t in view["tenants"].items()]
+        selected = [t["id"] for t in tenants if t.get("email") == selected_email]
+        issue_docs = load.query("issues", db.collection("issues").where("tenant", "==", selected[0]).get).wait() \
+            if selected else []
+    else:
+        summary = None
+        tenants_ref = db.collection("users").document(landlord_uid).collection("tenants")
+        tenants_docs = load.query("tenants", tenants_ref.get).wait()
+        tenants = [to_doc(doc.id, doc.to_dict()) for doc in tenants_docs]
+        # One chunked "in" query per 30 tenants, fetched concurrently (was one query per tenant)
+        issue_docs = load.spawn("issues", fetch_where_in, db.collection("issues"), "tenant",
+                                [t["id"] for t in tenants]).wait()
+
+    tenants = sorted(tenants, key=lambda t: t["id"])  # Firestore's default order
+    for t in tenants:
+        t["uid"] = t["id"]
+    tenant_emails = {t["id"]: t.get("email") for t in tenants}
+    tenant_order = {t["id"]: i for i, t in enumerate(tenants)}
+    issues = []
+    for doc in issue_docs:
+        issue = to_doc(doc.id, doc.to_dict())
+        issue["tenant_email"] = tenant_emails.get(issue.get("tenant"))
+        issues.append(issue)
+    issues.sort(key=lambda i: (tenant_order.get(i.get("tenant"), 0), i.get("created_at") or "", i["id"]))
+    return {"tenants": tenants, "issues": issues, "summary": summary}
+
+def _overview(summary, tenants):
+    """Counts, overdue and recent issues from a landlord summary, with tenant emails filled in."""
+    if not summary:
+        return None
+    view = summaries.view(summary)
+    emails = {t["id"]: t.get("email") for t in tenants}
+    with_email = lambda entries: [{**e, "tenant_email": emails.get(e.get("tenant"))} for e in entries]
+    return {
+        "counts": view["counts"],
+        "labels": view["labels"],
+        "overdue": with_email(summaries.overdue(view)),
+        "recent": with_email(view["recent"]),
+    }
+
+@landlord_bp.route("/landlord/dashboard")
+def dashboard_landlord():
+    if "username" in session and session.get("role") == "landlord":
+        selected_tenant_email = request.args.get("tenant_email")
+        state = _landlord_dashboard_state(session.get("uid"), selected_tenant_email)
         return render_template(
             "landlord_dashboard.html",
-            tenants=tenants,
-            landlord_issues=landlord_issues,
+            tenants=state["tenants"],
+            landlord_issues=state["issues"],
+            overview=_overview(state["summary"], state["tenants"]),
+            recent_n=summaries.RECENT_N,
             selected_tenant_email=selected_tenant_email
         )
     else:
@@ -68,21 +139,7 @@ def send_request():
             flash("Tenant email is missing.", "danger")
             return redirect(url_for("landlord.dashboard_landlord"))
 
-        subject = "Request from your Landlord"
-        body = "You have received a request from your landlord. Please log in to your dashboard to view the request."
-        msg = MIMEText(body)
-        msg["Subject"] = subject
-        msg["From"] = landlord_email
-        msg["To"] = tenant_email
-
         try:
-            smtp = smtplib.SMTP("smtp.gmail.com", 587)
-            smtp.starttls()
-            smtp.login(os.environ.get("GMAIL_USER"), os.environ.get("GMAIL_PASSWORD"))
-            smtp.sendmail(landlord_email, [tenant_email], msg.as_string())
-            smtp.quit()
-            print("Email sent successfully to", tenant_email)
-
             result = get_db().collection("requests").add({
                 "tenant_email": tenant_email,
                 "landlord_email": landlord_email,
@@ -91,6 +148,10 @@ def send_request():
                 "timestamp": firestore.SERVER_TIMESTAMP
             })
             print("Firestore request added with document ID:", result[1].id)
+
+            # The email goes out from the background mail queue; don't hold the request for SMTP
+            if not get_mailer().send(_invitation_email(landlord_email, tenant_email)):
+                print("Mail queue full, invitation email not queued for", tenant_email)
             flash("Request sent successfully!", "success")
 
         except Exception as e:
@@ -100,3 +161,125 @@ def send_request():
         flash("Unauthorized access", "danger")
 
     return redirect(url_for("landlord.dashboard_landlord"))
+
+@landlord_bp.route("/send-requests/bulk", methods=["POST"])
+def send_requests_bulk():
+    """
+    Invite many tenants at once (JSON {"emails": [...]}, a CSV upload or a
+    textarea). One query finds the landlord's pending requests, new request
+    docs go out in batched commits and the emails are queued in bulk.
+    Returns a per-email report (JSON callers) or flashes a summary.
+    """
+    wants_json = request.is_json or request.accept_mimetypes.best == "application/json"
+    if "username" not in session or session.get("role") != "landlord":
+        if wants_json:
+            return jsonify({"success": False, "error": "Unauthorized access"}), 401
+        flash("Unauthorized access", "danger")
+        return redirect(url_for("auth.login"))
+
+    landlord_email = session.get("username")
+    landlord_uid = session.get("uid")
+    t0 = time.perf_counter()
+
+    raw = _bulk_emails()
+    if len(raw) > BULK_INVITE_MAX:
+        error = f"Too many emails ({len(raw)}); the limit is {BULK_INVITE_MAX} per upload."
+        if wants_json:
+            return jsonify({"success": False, "error": error}), 413
+        flash(error, "danger")
+        return redirect(url_for("landlord.dashboard_landlord"))
+
+    results = []   # [{"email", "status", ...}] in input order
+    seen = set()
+    for entry in raw:
+        email = entry.strip().strip("<>\"'")
+        if not _EMAIL_RE.match(email):
+            results.append({"email": entry.strip(), "status": "invalid"})
+        elif email.lower() in seen:  # stored as typed, compared case-insensitively
+            results.append({"email": email, "status": "duplicate"})
+        else:
+            seen.add(email.lower())
+            results.append({"email": email, "status": None})
+
+    db = get_db()
+    requests_ref = db.collection("requests")
+    tenants_ref = db.collection("users").document(landlord_uid).collection("tenants")
+    load = get_loader()
+    pending_read = load.query("pending_requests", requests_ref
+                              .where("landlord_uid", "==", landlord_uid)
+                              .where("status", "==", "pending").get)
+    tenants_read = load.query("tenants", tenants_ref.get)
+    pending = {(d.to_dict().get("tenant_email") or "").lower() for d in pending_read.wait()}
+    attached = {(d.to_dict().get("email") or "").lower() for d in tenants_read.wait()}
+
+    writes = []
+    for result in results:
+        if result["status"] is not None:
+            continue
+        email = result["email"].lower()
+        if email in attached:
+            result["status"] = "already_tenant"
+        elif email in pending:
+            result["status"] = "already_pending"
+        else:
+            ref = requests_ref.document()
+            result["request_id"] = ref.id
+            writes.append((result, ref, {
+                "tenant_email": result["email"],
+                "landlord_email": landlord_email,
+                "landlord_uid": landlord_uid,
+                "status": "pending",
+                "timestamp": firestore.SERVER_TIMESTAMP
+            }))
+
+    errors = set_in_batches(db, [(ref, data) for _, ref, data in writes])
+    invited = []
+    for (result, _, _), err in zip(writes, errors):
+        if err is None:
+            result["status"] = "invited"
+            invited.append(result)
+        else:
+            result["status"] = "error"
+            result["error"] = str(err)
+            result.pop("request_id", None)
+
+    # Emails only go out for docs that were actually written
+    queued = get_mailer().send_many(_invitation_email(landlord_email, r["email"]) for r in invited)
+    if queued < len(invited):
+        print(f"[bulk_invite] mail queue full, {len(invited) - queued} invitation emails not queued")
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    elapsed_ms = round((time.perf_counter() - t0) * 1000, 1)
+    print(f"[bulk_invite] landlord={landlord_uid} rows={len(raw)} {summary} in {elapsed_ms}ms")
+
+    if wants_json:
+        return jsonify({"success": True, "summary": summary, "results": results,
+                        "emails_queued": queued, "elapsed_ms": elapsed_ms})
+
+    flash(", ".join(f"{n} {status.replace('_', ' ')}" for status, n in summary.items()) or "No emails found.",
+          "success" if summary.get("invited") else "warning")
+    return redirect(url_for("landlord.dashboard_landlord"))
+
+@landlord_bp.route("/landlord/reports.zip")
+def export_reports():
+    """Legal reports of all attached tenants (or ?tenant_email=) in one zip, one folder per tenant."""
+    if "username" not in session or session.get("role") != "landlord":
+        return redirect(url_for("auth.login"))
+    db = get_db()
+    tenants_ref = db.collection("users").document(session.get("uid")).collection("tenants")
+    tenant_emails = {doc.id: (doc.to_dict() or {}).get("email") or doc.id for doc in tenants_ref.get()}
+    only = request.args.get("tenant_email")
+    if only:
+        tenant_emails = {uid: email for uid, email in tenant_emails.items() if email == only}
+
+    issue_docs = fetch_where_in(db.collection("issues"), "tenant", list(tenant_emails))
+    entries = []
+    for doc in issue_docs:
+        issue = doc.to_dict()
+        if issue.get("ai_advice"):
+            folder = re.sub(r"[^A-Za-z0-9@._-]+", "_", tenant_emails.get(issue.get("tenant"), "unknown"))
+            entries.append((f"{folder}/{reports.report_filename(doc.id, issue)}", doc.id, issue))
+    entries.sort(key=lambda e: e[0])
+    return reports.zip_response(entries, "tenant-legal-reports.zip")
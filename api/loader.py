@@ -0,0 +1,58 @@
+"""
+Request-scoped data loader.
+
+Starts independent Firestore reads on green threads so they overlap, and
+dedupes identical document fetches within one request. Each read's time is
+recorded under its name in `timings` (ms), which the request logger prints.
+
+    load = get_loader()
+    reqs = load.query("requests", lambda: db.collection("requests")...get())
+    user = load.doc("users", uid)
+    ...
+    reqs.wait(), user.wait()
+"""
+import time
+
+from eventlet import GreenPool
+from flask import g, current_app
+
+
+class DataLoader:
+    def __init__(self, db, pool_size=8):
+        self.db = db
+        self._pool = GreenPool(pool_size)
+        self._docs = {}
+        self.timings = {}
+
+    def spawn(self, name, fn, *args):
+        """Start fn(*args) now; returns a GreenThread whose .wait() gives the result."""
+        def run():
+            t0 = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.timings[name] = (time.perf_counter() - t0) * 1000
+        return self._pool.spawn(run)
+
+    def query(self, name, fn):
+        return self.spawn(name, fn)
+
+    def doc(self, collection, doc_id):
+        """Fetch collection/doc_id once per request; later calls share the same read."""
+        path = f"{collection}/{doc_id}"
+        if path not in self._docs:
+            ref = self.db.collection(collection).document(doc_id)
+            self._docs[path] = self.spawn(path, ref.get)
+        return self._docs[path]
+
+    def doc_dict(self, collection, doc_id):
+        """Convenience: wait for doc() and return its data, or None if missing."""
+        snap = self.doc(collection, doc_id).wait()
+        return snap.to_dict() if snap is not None and snap.exists else None
+
+
+def get_loader():
+    """The DataLoader for the current request (created on first use)."""
+    if "loader" not in g:
+        g.loader = DataLoader(current_app.config["DB"])
+    return g.loader
@@ -0,0 +1,203 @@
+"""
+Background outbound mail.
+
+Handlers call get_mailer().send(...) / send_many(...) and return right away;
+`pool_size` green-thread workers each keep one persistent SMTP connection
+(STARTTLS + login once, reused until idle or broken) and drain the queue,
+sending runs of queued messages back-to-back on the same connection. Failed
+sends are retried with backoff after reconnecting.
+
+Configured from env:
+    MAIL_BACKEND     smtp (default) | console (print instead of sending)
+    SMTP_HOST / SMTP_PORT / SMTP_STARTTLS   default smtp.gmail.com / 587 / 1
+    GMAIL_USER / GMAIL_PASSWORD             login (skipped when unset)
+    MAIL_POOL_SIZE   concurrent SMTP connections (default 2)
+
+For local runs point SMTP_HOST/SMTP_PORT at bench/smtp_sink.py with
+SMTP_STARTTLS=0 and no GMAIL_USER.
+"""
+import os
+import time
+import atexit
+import smtplib
+import threading
+from email.mime.text import MIMEText
+
+import eventlet
+from eventlet.queue import LightQueue, Empty, Full
+
+from .metrics import span
+
+
+def build_message(sender, to, subject, body):
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = to
+    return msg
+
+
+class Mailer:
+    def __init__(self, host="smtp.gmail.com", port=587, username=None, password=None, starttls=True,
+                 backend="smtp", pool_size=2, max_retries=3, max_queue=10000, batch_size=50,
+                 idle_timeout=60, timeout=15):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.backend = backend
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._queue = LightQueue(max_queue)
+        self._workers = []
+        self._busy = 0
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connections_opened = 0
+
+    def start(self):
+        with self._lock:
+            if not self._workers:
+                self._workers = [eventlet.spawn(self._work) for _ in range(self.pool_size)]
+
+    def send(self, msg):
+        """Queue one MIME message. Returns False if the queue is full."""
+        self.start()
+        try:
+            self._queue.put_nowait(msg)
+        except Full:
+            return False
+        self.queued += 1
+        return True
+
+    def send_many(self, msgs):
+        """Queue many messages (bulk invitations); returns how many were accepted."""
+        return sum(1 for msg in msgs if self.send(msg))
+
+    # --- workers ---
+
+    def _connect(self):
+        with span("smtp", "connect", self.host):
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        self.connections_opened += 1
+        return smtp
+
+    @staticmethod
+    def _close(smtp):
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            pass
+
+    def _work(self):
+        smtp = None
+        last_used = 0.0
+        while True:
+            try:
+                msg = self._queue.get(timeout=self.idle_timeout)
+            except Empty:
+                self._close(smtp)  # don't hold an idle connection open forever
+                smtp = None
+                continue
+
+            with self._lock:
+                self._busy += 1
+            try:
+                run = [msg]
+                while len(run) < self.batch_size:
+                    try:
+                        run.append(self._queue.get_nowait())
+                    except Empty:
+                        break
+                if smtp is not None and time.monotonic() - last_used > self.idle_timeout:
+                    self._close(smtp)
+                    smtp = None
+                for msg in run:
+                    smtp = self._deliver(smtp, msg)
+                last_used = time.monotonic()
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    def _deliver(self, smtp, msg):
+        if self.backend == "console":
+            print(f"[mailer] To: {msg['To']} Subject: {msg['Subject']}\n{msg.get_payload()}")
+            self.sent += 1
+            return smtp
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                if smtp is None:
+                    smtp = self._connect()
+                with span("smtp", "sendmail", self.host):
+                    smtp.sendmail(msg["From"], [msg["To"]], msg.as_string())
+                self.sent += 1
+                return smtp
+            except smtplib.SMTPRecipientsRefused as e:
+                self.failed += 1  # permanent for this address; retrying won't help
+                print(f"[mailer] recipient refused {msg['To']}: {e}")
+                return smtp
+            except Exception as e:
+                self._close(smtp)
+                smtp = None
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    print(f"[mailer] giving up on {msg['To']} after {attempt + 1} attempts: {e}")
+                    return None
+                self.retries += 1
+                eventlet.sleep(0.5 * (2 ** attempt))
+        return smtp
+
+    def flush(self, timeout=10):
+        """Wait for the queue to drain (shutdown hook)."""
+        deadline = time.monotonic() + timeout
+        while (self._queue.qsize() or self._busy) and time.monotonic() < deadline:
+            eventlet.sleep(0.05)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "sending": self._busy,
+            "queued": self.queued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "connections_opened": self.connections_opened,
+        }
+
+
+_mailer = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer():
+    """Process-wide Mailer built from env on first use."""
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = Mailer(
+                host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+                port=int(os.getenv("SMTP_PORT", "587")),
+                username=os.environ.get("GMAIL_USER"),
+                password=os.environ.get("GMAIL_PASSWORD"),
+                starttls=os.getenv("SMTP_STARTTLS", "1") == "1",
+                backend=os.getenv("MAIL_BACKEND", "smtp"),
+                pool_size=int(os.getenv("MAIL_POOL_SIZE", "2")),
+            )
+            atexit.register(_mailer.flush)
+        return _mailer
@@ -0,0 +1,158 @@
+"""
+Write-behind persistence for chat messages.
+
+The socket handler emits a message to the room right away and hands the
+Firestore write to this queue; a background green thread commits queued
+messages in batches. The queue is bounded: when it is full, enqueue()
+blocks briefly (backpressure on the sender) and then reports failure so
+the caller can fall back to a direct write.
+"""
+import os
+import time
+import threading
+
+import eventlet
+from eventlet.queue import LightQueue, Empty, Full
+
+from .queries import BATCH_LIMIT
+
+
+class MessageWriter:
+    def __init__(self, db, on_flushed=None, max_queue=None, batch_size=None,
+                 flush_interval=None, max_retries=3, put_timeout=0.5):
+        self.db = db
+        self.on_flushed = on_flushed  # called with {chat_id: n_written} after each commit
+        self.max_queue = max_queue or int(os.getenv("CHAT_WRITE_QUEUE_MAX", "5000"))
+        self.batch_size = min(batch_size or int(os.getenv("CHAT_WRITE_BATCH", "200")), BATCH_LIMIT)
+        self.flush_interval = flush_interval or float(os.getenv("CHAT_WRITE_FLUSH_SEC", "0.05"))
+        self.max_retries = max_retries
+        self.put_timeout = put_timeout
+
+        self._queue = LightQueue(self.max_queue)
+        self._worker = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+        # counters
+        self.enqueued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.retries = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def _messages(self, chat_id):
+        return self.db.collection("chats").document(chat_id).collection("messages")
+
+    def start(self):
+        if self._worker is None:
+            self._worker = eventlet.spawn(self._run)
+
+    def enqueue(self, chat_id, data, doc_id=None):
+        """Queue a message for persistence. Returns False if the queue stayed full."""
+        self.start()
+        try:
+            self._queue.put((chat_id, data, doc_id), timeout=self.put_timeout)
+        except Full:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def write_now(self, chat_id, data, doc_id=None):
+        """Synchronous fallback used when the queue rejects a message."""
+        self._messages(chat_id).document(doc_id).set(data)
+        self._notify({chat_id: 1})
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            with self._lock:
+                self._inflight += 1
+            try:
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except Empty:
+                        break
+                self._commit(batch)
+            finally:
+                with self._lock:
+                    self._inflight -= 1
+
+    def _commit(self, items):
+        for attempt in range(self.max_retries + 1):
+            t0 = time.perf_counter()
+            try:
+                batch = self.db.batch()
+                for chat_id, data, doc_id in items:
+                    batch.set(self._messages(chat_id).document(doc_id), data)
+                batch.commit()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(items)
+                    print(f"[chat-writer] dropped {len(items)} messages after {attempt + 1} attempts: {e}")
+                    return
+                self.retries += 1
+                eventlet.sleep(0.2 * (2 ** attempt))
+                continue
+
+            dt = (time.perf_counter() - t0) * 1000
+            self.batches += 1
+            self.flushed += len(items)
+            self.last_flush_ms = dt
+            self.max_flush_ms = max(self.max_flush_ms, dt)
+            self._total_flush_ms += dt
+            counts = {}
+            for chat_id, _, _ in items:
+                counts[chat_id] = counts.get(chat_id, 0) + 1
+            self._notify(counts)
+            return
+
+    def _notify(self, counts):
+        if self.on_flushed:
+            try:
+                self.on_flushed(counts)
+            except Exception as e:
+                print(f"[chat-writer] on_flushed failed: {e}")
+
+    def flush(self, timeout=10):
+        """Drain the queue synchronously and wait for in-flight commits (shutdown hook)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            items = []
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            if items:
+                self._commit(items)
+                continue
+            if self._inflight == 0 or time.monotonic() >= deadline:
+                return
+            eventlet.sleep(0.01)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self.max_queue,
+            "inflight_batches": self._inflight,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 1),
+            "max_flush_ms": round(self.max_flush_ms, 1),
+            "avg_flush_ms": round(self._total_flush_ms / self.batches, 1) if self.batches else 0.0,
+        }
@@ -0,0 +1,210 @@
+"""
+Latency instrumentation.
+
+Every outbound call is recorded as a span - backend (firestore, gemini,
+roboflow, smtp, ...), op and target (collection, model id, host) - into an
+in-memory histogram; requests are recorded per route. /metrics serves the
+histograms plus the app's /_stats counters in Prometheus text format.
+
+    with span("gemini", "generate_content", model):
+        ...
+
+instrument_firestore() patches the Firestore client classes so every
+document/query/batch call is a span without touching call sites.
+init_app(app) adds the request histogram, /metrics and, with
+METRICS_SERVER_TIMING=1, a Server-Timing header with the request's spans.
+
+/metrics (and /_stats, via require_token) answer only requests that send
+`Authorization: Bearer $METRICS_TOKEN`; without METRICS_TOKEN they are off
+and return 404.
+"""
+import os
+import re
+import hmac
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+from flask import Response, abort, g, has_request_context, request
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING") == "1"
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self.snapshot().items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, label_values))
+            sep = "," if labels else ""
+            for bound, n in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {n}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-2]}')
+            lines.append(f"{self.name}_count{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:.6f}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+requests_hist = Histogram("patch_http_request_seconds", "HTTP request latency by route",
+                          ("method", "route", "status"))
+calls_hist = Histogram("patch_backend_call_seconds", "Outbound call latency by backend/op/target",
+                       ("backend", "op", "target", "outcome"))
+_collectors = []  # callables returning nested dicts of numbers (e.g. /_stats)
+
+
+def observe_call(backend, op, target, seconds, outcome="ok"):
+    calls_hist.observe(seconds, backend, op, target or "", outcome)
+    if has_request_context():
+        spans = g.setdefault("_spans", {})
+        key = f"{backend}.{op}"
+        total, count = spans.get(key, (0.0, 0))
+        spans[key] = (total + seconds, count + 1)
+
+
+@contextmanager
+def span(backend, op, target=""):
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        observe_call(backend, op, target, time.perf_counter() - t0, outcome)
+
+
+def register_collector(fn):
+    _collectors.append(fn)
+
+
+# --- Firestore ---
+
+def _wrap(cls, method, op, target_of):
+    original = getattr(cls, method)
+    if getattr(original, "_instrumented", False):
+        return
+
+    def wrapper(self, *args, **kwargs):
+        with span("firestore", op, target_of(self)):
+            return original(self, *args, **kwargs)
+
+    wrapper._instrumented = True
+    wrapper.__name__ = original.__name__
+    wrapper.__doc__ = original.__doc__
+    setattr(cls, method, wrapper)
+
+
+def instrument_firestore():
+    """Record a span for every Firestore RPC made through the sync client."""
+    from google.cloud.firestore_v1.document import DocumentReference
+    from google.cloud.firestore_v1.query import Query
+    from google.cloud.firestore_v1.aggregation import AggregationQuery
+    from google.cloud.firestore_v1.batch import WriteBatch
+    from google.cloud.firestore_v1.transaction import Transaction
+
+    def doc_target(ref):
+        return ref._path[-2] if len(ref._path) >= 2 else ""
+
+    def query_target(query):
+        return getattr(query._parent, "id", "")
+
+    # CollectionReference.get/add go through Query.get / DocumentReference.create
+    for method in ("get", "set", "update", "delete", "create"):
+        _wrap(DocumentReference, method, f"doc.{method}", doc_target)
+    _wrap(Query, "get", "query.get", query_target)
+    _wrap(AggregationQuery, "get", "aggregate.get", lambda q: query_target(q._nested_query))
+    _wrap(WriteBatch, "commit", "batch.commit", lambda batch: "")
+    _wrap(Transaction, "_commit", "transaction.commit", lambda transaction: "")
+
+
+# --- Flask wiring ---
+
+def _stat_lines(prefix, data, lines):
+    for key, value in data.items():
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            _stat_lines(name, value, lines)
+        elif isinstance(value, bool):
+            lines.append(f"{name} {int(value)}")
+        elif isinstance(value, (int, float)):
+            lines.append(f"{name} {value}")
+
+
+def render():
+    lines = requests_hist.render() + calls_hist.render()
+    for collect in _collectors:
+        try:
+            _stat_lines("patch", collect(), lines)
+        except Exception as e:
+            lines.append(f"# collector failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def require_token(view):
+    """404 unless METRICS_TOKEN is set and the request sends it as a bearer token."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = os.getenv("METRICS_TOKEN")
+        sent = request.headers.get("Authorization", "")
+        if not token or not hmac.compare_digest(sent.encode(), f"Bearer {token}".encode()):
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_app(app):
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _metrics_finish(resp):
+        t0 = g.get("_metrics_t0")
+        if t0 is None:
+            return resp
+        elapsed = time.perf_counter() - t0
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        requests_hist.observe(elapsed, request.method, route, str(resp.status_code))
+        if SERVER_TIMING:
+            parts = [f'{name};dur={total * 1000:.1f};desc="x{count}"'
+                     for name, (total, count) in g.get("_spans", {}).items()]
+            if "loader" in g:
+                parts += [f"load.{re.sub(r'[^a-zA-Z0-9_.-]', '_', name)};dur={ms:.1f}"
+                          for name, ms in g.loader.timings.items()]
+            parts.append(f"app;dur={elapsed * 1000:.1f}")
+            resp.headers["Server-Timing"] = ", ".join(parts)
+        return resp
+
+    @app.get("/metrics")
+    @require_token
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, redirect, url_for, session, flash, request, current_app
 from werkzeug.security import generate_password_hash
+from . import profiles
 
 profile_bp = Blueprint("profilepage", __name__, template_folder="templates")
 
@@ -14,13 +15,11 @@ def profile():
     
     user_id = session.get("uid")
     user_ref = get_db().collection("users").document(user_id)
-    user_doc = user_ref.get()
+    user_data = profiles.get_profile(user_id)
     
-    if not user_doc.exists:
+    if not user_data:
         flash("User data not found.", "danger")
         return redirect(url_for("auth.login"))
-    
-    user_data = user_doc.to_dict()
 
     if request.method == "POST":
         updated_username = request.form.get("username")
@@ -41,6 +40,9 @@ def profile():
             updates["password"] = hashed_password
         
         user_ref.update(updates)
+        profiles.invalidate(user_id)
+        user_data.update(updates)
+        profiles.remember(user_data)
         flash("Profile updated successfully!", "success")
         return redirect(url_for("profilepage.profile"))
     
@@ -0,0 +1,96 @@
+"""
+Cached users/{uid} profiles.
+
+get_profile(uid) serves profiles from an in-process TTL cache; concurrent
+misses for the same uid share one Firestore read. The stable fields routes
+actually need (SESSION_FIELDS) are also copied into the signed session by
+remember(), so session_profile() usually costs no read at all. Anything that
+writes a profile calls invalidate(uid) (and remember() when it is the session
+user's own profile).
+
+    PROFILE_CACHE_TTL_SEC     default 300
+    PROFILE_CACHE_SIZE        default 10000
+    PROFILE_CACHE_DISABLED=1  always read Firestore, ignore session copies (debugging)
+"""
+import os
+import threading
+
+from flask import current_app, session
+
+from .cache import TTLCache, SingleFlight
+
+SESSION_FIELDS = ("role", "username", "state", "landlord", "landlord_uid")
+DISABLED = os.getenv("PROFILE_CACHE_DISABLED") == "1"
+
+_cache = TTLCache(maxsize=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+                  ttl=int(os.getenv("PROFILE_CACHE_TTL_SEC", "300")), name="profile-cache")
+_flight = SingleFlight()
+_generation = {}  # uid -> bumped by invalidate(), so a read racing a write is not cached
+_lock = threading.Lock()
+_counters = {"session_hits": 0, "firestore_reads": 0}
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def _fetch(db, uid):
+    _count("firestore_reads")
+    snap = db.collection("users").document(uid).get()
+    return snap.to_dict() if snap.exists else None
+
+
+def get_profile(uid):
+    """users/{uid} as a dict (a copy, safe to mutate), or None if there is no such user."""
+    if not uid:
+        return None
+    db = current_app.config["DB"]
+    if DISABLED:
+        return _fetch(db, uid)
+
+    profile = _cache.get(uid)
+    if profile is None:
+        generation = _generation.get(uid, 0)
+        profile = _flight.do(uid, _fetch, db, uid)
+        if profile is None:
+            return None
+        if _generation.get(uid, 0) == generation:
+            _cache.set(uid, profile)
+    return dict(profile)
+
+
+def invalidate(uid):
+    with _lock:
+        _generation[uid] = _generation.get(uid, 0) + 1
+    _cache.pop(uid)
+
+
+def remember(profile):
+    """Keep the stable fields of the session user's profile in the session cookie."""
+    if not DISABLED:
+        session["profile"] = {field: profile.get(field) for field in SESSION_FIELDS}
+
+
+def session_profile():
+    """SESSION_FIELDS for the logged-in user, from the session when present."""
+    if not DISABLED and "profile" in session:
+        _count("session_hits")
+        return dict(session["profile"])
+    profile = get_profile(session.get("uid")) or {}
+    remember(profile)
+    return {field: profile.get(field) for field in SESSION_FIELDS}
+
+
+def stats():
+    cache = _cache.stats()
+    served = cache["hits"] + _counters["session_hits"]
+    lookups = served + _counters["firestore_reads"]
+    return {
+        "disabled": DISABLED,
+        "cache": cache,
+        "session_hits": _counters["session_hits"],
+        "firestore_reads": _counters["firestore_reads"],
+        "coalesced": _flight.coalesced,
+        "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+    }
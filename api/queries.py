@@ -0,0 +1,82 @@
+"""
+Shared Firestore query helpers.
+"""
+import datetime
+
+from eventlet import GreenPool
+
+IN_QUERY_LIMIT = 30  # Firestore allows at most 30 values in an "in" filter
+BATCH_LIMIT = 500  # Firestore caps a write batch at 500 operations
+OMIT_FIELDS = ("ai_advice",)  # left out of to_doc(); large, and the dashboards only need to know it exists
+
+
+def chunked(values, size=IN_QUERY_LIMIT):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def fetch_where_in(collection_ref, field, values, pool_size=8):
+    """
+    Fetch every doc whose `field` is in `values`, as one "in" query per chunk of
+    IN_QUERY_LIMIT values run concurrently on a GreenPool. Latency scales with
+    the number of chunks / pool_size instead of len(values). Docs are returned
+    in chunk order (callers that need a specific order should sort).
+    """
+    values = list(dict.fromkeys(v for v in values if v))  # dedupe, keep order
+    if not values:
+        return []
+    chunks = list(chunked(values))
+    if len(chunks) == 1:
+        return list(collection_ref.where(field, "in", chunks[0]).get())
+
+    pool = GreenPool(min(pool_size, len(chunks)))
+    results = pool.imap(lambda chunk: collection_ref.where(field, "in", chunk).get(), chunks)
+    return [doc for docs in results for doc in docs]
+
+
+def _plain(value):
+    """Firestore values -> plain ones (timestamps become ISO strings)."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def to_doc(doc_id, data):
+    """Firestore document -> the dict shape the dashboards render."""
+    doc = {k: _plain(v) for k, v in data.items() if k not in OMIT_FIELDS}
+    doc["id"] = doc_id
+    if "ai_advice" in data:
+        doc["has_advice"] = bool(data["ai_advice"])
+    return doc
+
+
+def set_in_batches(db, writes, pool_size=4, merge=False):
+    """
+    Apply (doc_ref, data) sets as write batches of at most BATCH_LIMIT,
+    committed concurrently. Returns one entry per write: None on success or
+    the exception its batch failed with, so callers can report per row.
+    merge=True only touches the given fields (set(..., merge=True)).
+    """
+    writes = list(writes)
+    chunks = list(chunked(writes, BATCH_LIMIT))
+    if not chunks:
+        return []
+
+    def commit(chunk):
+        batch = db.batch()
+        for ref, data in chunk:
+            batch.set(ref, data, merge=merge)
+        try:
+            batch.commit()
+            return [None] * len(chunk)
+        except Exception as e:
+            return [e] * len(chunk)
+
+    pool = GreenPool(min(pool_size, len(chunks)))
+    return [err for errs in pool.imap(commit, chunks) for err in errs]
@@ -0,0 +1,226 @@
+"""
+Legal report (.docx) rendering.
+
+Reports are rendered onto a template loaded once per process (the file at
+REPORT_TEMPLATE_PATH if set, otherwise python-docx's default with our styles
+applied), with the Gemini letter's markdown-ish formatting - #/## headings,
+-/* bullets, 1. numbered items, **bold** and *italic* - turned into real
+Word formatting. Rendered bytes are cached by a hash of everything that goes
+into the document, which doubles as the download's ETag.
+
+zip_stream()/zip_response() stream many reports as one zip without building
+it in memory.
+"""
+import io
+import os
+import re
+import time
+import hashlib
+import zipfile
+import datetime
+
+import eventlet
+from flask import Response, stream_with_context
+
+from .cache import TTLCache
+
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+TEMPLATE_VERSION = "1"  # bump when render() output changes so cached bytes are not reused
+TEMPLATE_PATH = os.getenv("REPORT_TEMPLATE_PATH")
+
+_cache = TTLCache(maxsize=int(os.getenv("REPORT_CACHE_SIZE", "256")),
+                  ttl=int(os.getenv("REPORT_CACHE_TTL_SEC", str(24 * 3600))), name="report-cache")
+_template = None
+
+_HEADING = re.compile(r"^(#{1,3})\s+(.*)$")
+_BULLET = re.compile(r"^\s*[-*•]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_INLINE = re.compile(r"(\*\*[^*]+\*\*|\*[^*\s][^*]*\*)")
+
+
+def _load_template():
+    """Template bytes, built once. Each render opens a fresh Document from them."""
+    global _template
+    if _template is None:
+        from docx import Document
+        from docx.shared import Pt
+
+        if TEMPLATE_PATH:
+            with open(TEMPLATE_PATH, "rb") as f:
+                _template = f.read()
+        else:
+            document = Document()
+            normal = document.styles["Normal"]
+            normal.font.name = "Calibri"
+            normal.font.size = Pt(11)
+            document.sections[0].footer.paragraphs[0].text = "Generated by Patch"
+            buf = io.BytesIO()
+            document.save(buf)
+            _template = buf.getvalue()
+    return _template
+
+
+def _add_inline(paragraph, text):
+    for part in _INLINE.split(text):
+        if not part:
+            continue
+        if part.startswith("**") and part.endswith("**"):
+            paragraph.add_run(part[2:-2]).bold = True
+        elif part.startswith("*") and part.endswith("*") and len(part) > 2:
+            paragraph.add_run(part[1:-1]).italic = True
+        else:
+            paragraph.add_run(part)
+
+
+def _add_body(document, text):
+    """Markdown-ish letter text -> headings, bullet/numbered lists and paragraphs.
+
+    Blank lines separate paragraphs; single line breaks inside a paragraph
+    (address blocks, sign-offs) are kept as line breaks.
+    """
+    pending = []
+
+    def flush():
+        if pending:
+            paragraph = document.add_paragraph()
+            for i, line in enumerate(pending):
+                if i:
+                    paragraph.add_run().add_break()
+                _add_inline(paragraph, line)
+            pending.clear()
+
+    for raw in text.replace("\r\n", "\n").split("\n"):
+        line = raw.strip()
+        heading = _HEADING.match(line)
+        bullet = _BULLET.match(line)
+        numbered = _NUMBERED.match(line)
+        if not line:
+            flush()
+        elif heading:
+            flush()
+            document.add_heading(heading.group(2).strip("* "), level=len(heading.group(1)))
+        elif bullet:
+            flush()
+            _add_inline(document.add_paragraph(style="List Bullet"), bullet.group(1))
+        elif numbered:
+            flush()
+            _add_inline(document.add_paragraph(style="List Number"), numbered.group(1))
+        else:
+            pending.append(line)
+    flush()
+
+
+def _fmt_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%d %B %Y")
+    return str(value) if value else "-"
+
+
+def _fields(issue_id, issue):
+    return {
+        "issue_id": issue_id,
+        "label": issue.get("label") or "Issue",
+        "status": issue.get("status") or "-",
+        "days": issue.get("days"),
+        "created": _fmt_date(issue.get("created_at")),
+        "advice": issue.get("ai_advice") or "",
+    }
+
+
+def content_key(issue_id, issue):
+    """Hash of everything render() reads; the cache key and ETag."""
+    fields = _fields(issue_id, issue)
+    raw = "\x1f".join([TEMPLATE_VERSION] + [f"{k}={fields[k]}" for k in sorted(fields)])
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def render(issue_id, issue):
+    from docx import Document  # python-docx is only imported once a report is rendered
+
+    fields = _fields(issue_id, issue)
+    document = Document(io.BytesIO(_load_template()))
+    document.add_heading(f"Legal Report: {fields['label']}", level=0)
+
+    table = document.add_table(rows=0, cols=2)
+    for name, value in (("Issue", fields["label"]), ("Reference", issue_id), ("Reported", fields["created"]),
+                        ("Status", fields["status"].title()),
+                        ("Statutory period", f"{fields['days']} days" if fields["days"] else "-")):
+        row = table.add_row().cells
+        row[0].text = name
+        row[0].paragraphs[0].runs[0].bold = True
+        row[1].text = str(value)
+
+    document.add_heading("Complaint Letter", level=1)
+    _add_body(document, fields["advice"])
+
+    buf = io.BytesIO()
+    document.save(buf)
+    return buf.getvalue()
+
+
+def get_report(issue_id, issue):
+    """(docx bytes, etag, rendered_at) for an issue, rendering only on a cache miss."""
+    key = content_key(issue_id, issue)
+    cached = _cache.get(key)
+    if cached is None:
+        cached = (render(issue_id, issue), time.time())
+        _cache.set(key, cached)
+    return cached[0], key, cached[1]
+
+
+def report_filename(issue_id, issue):
+    label = re.sub(r"[^A-Za-z0-9]+", "-", issue.get("label") or "issue").strip("-").lower() or "issue"
+    return f"{label}-{issue_id}.docx"
+
+
+class _ZipSink:
+    """Write-only stream for ZipFile that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(entries):
+    """
+    Yield a zip of (path_in_zip, issue_id, issue) reports chunk by chunk.
+    .docx files are already deflated, so they are stored as-is.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for path, issue_id, issue in entries:
+            data, _, rendered_at = get_report(issue_id, issue)
+            info = zipfile.ZipInfo(path, date_time=time.localtime(rendered_at)[:6])
+            archive.writestr(info, data)
+            yield sink.drain()
+            eventlet.sleep(0)  # rendering is CPU work; let other greenlets run between files
+    yield sink.drain()
+
+
+def zip_response(entries, filename):
+    """Stream (path_in_zip, issue_id, issue) reports as one zip download."""
+    return Response(
+        stream_with_context(zip_stream(entries)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def stats():
+    return _cache.stats()
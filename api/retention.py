@@ -0,0 +1,140 @@
+"""
+Chat history retention.
+
+Keeps a running message count per room so the send path never re-reads a
+room's history, and trims overflow (by count and optionally by age) with
+batched deletes on a background green thread.
+"""
+import os
+import time
+import datetime
+import threading
+
+import eventlet
+
+from .queries import BATCH_LIMIT
+
+
+class RetentionPolicy:
+    """How much history a room keeps.
+
+    max_messages: newest messages to keep per room (None = unbounded)
+    max_age_sec:  drop messages older than this (None = keep forever)
+    slack:        extra messages allowed before a trim runs. 0 keeps
+                  max_messages a hard limit (a trim after every send past
+                  it); a larger value batches deletes across sends
+    sweep_interval_sec: how often a room's count is re-seeded and its
+                  age limit enforced
+    """
+
+    def __init__(self, max_messages=10, max_age_sec=None, slack=0, sweep_interval_sec=300):
+        self.max_messages = max_messages
+        self.max_age_sec = max_age_sec
+        self.slack = slack
+        self.sweep_interval_sec = sweep_interval_sec
+
+    @classmethod
+    def from_env(cls):
+        def _int(name, default):
+            raw = os.getenv(name)
+            return int(raw) if raw not in (None, "") else default
+
+        return cls(
+            max_messages=_int("CHAT_RETENTION_MAX_MESSAGES", 10),
+            max_age_sec=_int("CHAT_RETENTION_MAX_AGE_SEC", None),
+            slack=_int("CHAT_RETENTION_SLACK", 0),
+            sweep_interval_sec=_int("CHAT_RETENTION_SWEEP_SEC", 300),
+        )
+
+
+class RetentionEngine:
+    def __init__(self, db, policy=None):
+        self.db = db
+        self.policy = policy or RetentionPolicy.from_env()
+        self._counts = {}      # chat_id -> known message count
+        self._last_sweep = {}  # chat_id -> monotonic time of last seed/age sweep
+        self._busy = set()     # rooms with a trim in flight
+        self._lock = threading.Lock()
+        self.deleted = 0
+
+    def _messages(self, chat_id):
+        return self.db.collection("chats").document(chat_id).collection("messages")
+
+    def record(self, chat_id, n=1):
+        """Account for n newly stored messages; schedules a trim when needed. Never blocks."""
+        p = self.policy
+        now = time.monotonic()
+        with self._lock:
+            if chat_id in self._counts:
+                self._counts[chat_id] += n
+            if chat_id in self._busy:
+                return
+            count = self._counts.get(chat_id)
+            sweep_due = now - self._last_sweep.get(chat_id, 0) >= p.sweep_interval_sec
+            over = p.max_messages is not None and count is not None \
+                and count > p.max_messages + p.slack
+            if not (count is None or sweep_due or over):
+                return
+            self._busy.add(chat_id)
+        eventlet.spawn_n(self._trim, chat_id, count is None or sweep_due)
+
+    def count(self, chat_id):
+        return self._counts.get(chat_id)
+
+    def _trim(self, chat_id, sweep):
+        try:
+            if sweep:
+                self._seed(chat_id)
+                if self.policy.max_age_sec:
+                    self._trim_by_age(chat_id)
+            self._trim_by_count(chat_id)
+        except Exception as e:
+            print(f"[retention] trim failed for {chat_id}: {e}")
+            with self._lock:
+                self._counts.pop(chat_id, None)  # force a re-seed next time
+        finally:
+            with self._lock:
+                self._busy.discard(chat_id)
+
+    def _seed(self, chat_id):
+        result = self._messages(chat_id).count().get()
+        total = int(result[0][0].value)
+        with self._lock:
+            self._counts[chat_id] = total
+            self._last_sweep[chat_id] = time.monotonic()
+
+    def _trim_by_count(self, chat_id):
+        limit = self.policy.max_messages
+        if limit is None:
+            return
+        with self._lock:
+            overflow = self._counts.get(chat_id, 0) - limit
+        while overflow > 0:
+            docs = self._messages(chat_id).order_by("timestamp") \
+                .limit(min(overflow, BATCH_LIMIT)).get()
+            if not docs:
+                break
+            self._delete(chat_id, docs)
+            overflow -= len(docs)
+
+    def _trim_by_age(self, chat_id):
+        cutoff = datetime.datetime.now(datetime.timezone.utc) \
+            - datetime.timedelta(seconds=self.policy.max_age_sec)
+        while True:
+            docs = self._messages(chat_id).where("timestamp", "<", cutoff) \
+                .order_by("timestamp").limit(BATCH_LIMIT).get()
+            if not docs:
+                break
+            self._delete(chat_id, docs)
+            if len(docs) < BATCH_LIMIT:
+                break
+
+    def _delete(self, chat_id, docs):
+        batch = self.db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        with self._lock:
+            if chat_id in self._counts:
+                self._counts[chat_id] = max(0, self._counts[chat_id] - len(docs))
+            self.deleted += len(docs)
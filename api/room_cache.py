@@ -0,0 +1,218 @@
+"""
+Hot-room chat cache.
+
+Keeps the newest messages of recently active rooms in memory so load_chat
+can answer from the process instead of Firestore. A room is only cached
+once it has been loaded from Firestore (so we know its tail); after that,
+messages sent through this worker are appended as they are emitted.
+
+Bounds: per_room messages per room, max_rooms rooms (LRU), and an
+approximate max_bytes across all rooms.
+
+Consistency across workers: once the write-behind queue has committed a
+room's messages, the room is published on an invalidation channel
+(RedisInvalidator when ROOM_CACHE_PUBSUB_URL is set); other workers drop
+that room and re-read it from Firestore on the next load. Publishing at
+append time instead would let them re-cache a tail without the message.
+Without a channel, each room entry expires `ttl` seconds after it was
+filled, which bounds staleness when several workers serve the same room.
+"""
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+from collections import OrderedDict, deque
+
+import eventlet
+
+
+class _Room:
+    __slots__ = ("messages", "exhausted", "filled_at", "bytes")
+
+    def __init__(self, per_room):
+        self.messages = deque(maxlen=per_room)
+        self.exhausted = False  # True when the buffer holds the room's entire history
+        self.filled_at = time.monotonic()
+        self.bytes = 0
+
+
+def _ts(value):
+    ts = datetime.datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=datetime.timezone.utc)
+
+
+def _key(message):
+    return _ts(message["timestamp"]), message.get("id") or ""
+
+
+def _size(message):
+    return len(str(message.get("message", ""))) + 200  # payload + rough per-message overhead
+
+
+class RoomCache:
+    def __init__(self, per_room=50, max_rooms=1000, max_bytes=32 * 1024 * 1024, ttl=None, invalidator=None):
+        self.per_room = per_room
+        self.max_rooms = max_rooms
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.invalidator = invalidator
+        self._rooms = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if invalidator is not None:
+            invalidator.start(self._drop_remote)
+
+    def _get(self, chat_id):
+        room = self._rooms.get(chat_id)
+        if room is None:
+            return None
+        if self.ttl is not None and time.monotonic() - room.filled_at > self.ttl:
+            self._remove(chat_id)
+            return None
+        self._rooms.move_to_end(chat_id)
+        return room
+
+    def _remove(self, chat_id):
+        room = self._rooms.pop(chat_id, None)
+        if room is not None:
+            self._bytes -= room.bytes
+
+    def _evict(self):
+        while self._rooms and (len(self._rooms) > self.max_rooms or self._bytes > self.max_bytes):
+            _, room = self._rooms.popitem(last=False)
+            self._bytes -= room.bytes
+
+    def _push(self, room, message):
+        if len(room.messages) == room.messages.maxlen:
+            room.bytes -= _size(room.messages[0])
+            self._bytes -= _size(room.messages[0])
+            room.exhausted = False
+        room.messages.append(message)
+        room.bytes += _size(message)
+        self._bytes += _size(message)
+
+    def latest(self, chat_id, limit):
+        """Newest `limit` messages (oldest first), or None if the room isn't warm enough."""
+        with self._lock:
+            room = self._get(chat_id)
+            if room is not None and (len(room.messages) >= limit or room.exhausted):
+                self.hits += 1
+                return list(room.messages)[-limit:]
+            self.misses += 1
+            return None
+
+    def since(self, chat_id, cursor, limit):
+        """Messages after cursor, a (timestamp, id) pair, or None if the buffer may not reach back that far."""
+        with self._lock:
+            room = self._get(chat_id)
+            if room is not None and (room.exhausted or (room.messages and _key(room.messages[0]) <= cursor)):
+                self.hits += 1
+                return sorted((m for m in room.messages if _key(m) > cursor), key=_key)[:limit]
+            self.misses += 1
+            return None
+
+    def fill(self, chat_id, messages, exhausted):
+        """Seed a room from a Firestore read of its newest messages (oldest first)."""
+        with self._lock:
+            old = self._rooms.get(chat_id)
+            room = _Room(self.per_room)
+            room.exhausted = exhausted and len(messages) <= self.per_room
+            seen = set()
+            for message in messages[-self.per_room:]:
+                self._push(room, message)
+                seen.add(message.get("id"))
+            # Keep messages sent here that the write-behind queue hasn't persisted yet
+            if old is not None and messages:
+                newest = _ts(messages[-1]["timestamp"])
+                for message in old.messages:
+                    if message.get("id") not in seen and _ts(message["timestamp"]) > newest:
+                        self._push(room, message)
+            self._remove(chat_id)
+            self._rooms[chat_id] = room
+            self._bytes += room.bytes
+            self._evict()
+
+    def append(self, chat_id, message):
+        """Record a message sent through this worker (only rooms already cached)."""
+        with self._lock:
+            room = self._get(chat_id)
+            if room is not None:
+                self._push(room, message)
+                self._evict()
+
+    def committed(self, chat_id):
+        """Tell other workers the room changed, once its new messages are in Firestore."""
+        if self.invalidator is not None:
+            self.invalidator.publish(chat_id)
+
+    def invalidate(self, chat_id):
+        with self._lock:
+            self._remove(chat_id)
+
+    def _drop_remote(self, chat_id):
+        with self._lock:
+            if chat_id in self._rooms:
+                self.invalidations += 1
+            self._remove(chat_id)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "rooms": len(self._rooms),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "remote_invalidations": self.invalidations,
+        }
+
+
+class RedisInvalidator:
+    """Pub/sub channel telling other workers which rooms changed."""
+
+    def __init__(self, url, channel="patch:room-cache"):
+        import redis  # optional dependency, only needed for multi-worker deployments
+
+        self.redis = redis.Redis.from_url(url)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex  # ignore our own messages
+
+    def start(self, on_invalidate):
+        def listen():
+            while True:
+                try:
+                    pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    for item in pubsub.listen():
+                        data = json.loads(item["data"])
+                        if data.get("origin") != self.origin:
+                            on_invalidate(data["room"])
+                except Exception as e:
+                    print(f"[room-cache] invalidation listener error: {e}")
+                    eventlet.sleep(1)
+
+        eventlet.spawn_n(listen)
+
+    def publish(self, chat_id):
+        try:
+            self.redis.publish(self.channel, json.dumps({"room": chat_id, "origin": self.origin}))
+        except Exception as e:
+            print(f"[room-cache] publish failed: {e}")
+
+
+def build_room_cache():
+    url = os.getenv("ROOM_CACHE_PUBSUB_URL")
+    ttl = os.getenv("ROOM_CACHE_TTL_SEC")
+    return RoomCache(
+        per_room=int(os.getenv("ROOM_CACHE_PER_ROOM", "50")),
+        max_rooms=int(os.getenv("ROOM_CACHE_MAX_ROOMS", "1000")),
+        max_bytes=int(os.getenv("ROOM_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        # with pub/sub invalidation entries live until evicted; without it, bound staleness
+        ttl=float(ttl) if ttl else (None if url else 30.0),
+        invalidator=RedisInvalidator(url) if url else None,
+    )
@@ -0,0 +1,348 @@
+"""
+Materialized dashboard summaries.
+
+summaries/tenant:{uid} and summaries/landlord:{uid} hold what a dashboard
+shows at a glance, kept current by the writes that change it, so the page
+renders from one document read instead of every issue:
+
+    counts    {status: n}
+    labels    {label: n}
+    open      {issue_id: entry}     unresolved issues; overdue = due_at passed
+    recent    {issue_id: entry}     newest issues (RECENT_N are shown)
+    tenants   {uid: {"email", "counts"}}            (landlord only)
+    landlord_uid                                     (tenant only)
+
+where entry = {label, status, days, created_at, due_at, tenant}.
+
+create_issue()/update_issue() write the issue and both summaries in one
+transaction, along with the issue's deadline fields (api/deadlines.py) when
+its days or status change. The transaction only reads the issue: summary
+changes are blind merge writes (Increment counters, per-issue map fields), so
+a landlord summary that every tenant's writes touch never makes them
+conflict. `recent` only ever grows that way; for_dashboard() trims it once
+it passes 2 x RECENT_N. move_tenant() moves a tenant's totals to their new
+landlord inside the accept transaction, the same way.
+
+For existing data (or to repair drift) recompute everything from the issues:
+
+    python -m api.summaries rebuild
+
+Incremental writes only ever add to what is there, so a summary they create
+holds just the changes since. Only rebuild() and start() (a new user, who
+has nothing to count yet) write a summary in full, and they stamp it with
+`version`; complete() is what dashboards check before trusting one.
+"""
+import os
+import argparse
+import datetime
+
+import eventlet
+from firebase_admin import firestore
+
+from . import deadlines
+from .queries import set_in_batches
+
+RECENT_N = int(os.getenv("SUMMARY_RECENT_N", "20"))
+VERSION = 1  # bump when the shape changes; dashboards then read raw data until the next rebuild
+OPEN_STATUSES = ("pending", "generating", "failed")
+
+
+def summary_ref(db, role, uid):
+    return db.collection("summaries").document(f"{role}:{uid}")
+
+
+def empty(role, uid):
+    summary = {"role": role, "uid": uid, "counts": {}, "labels": {}, "open": {}, "recent": {}}
+    if role == "landlord":
+        summary["tenants"] = {}
+    else:
+        summary["landlord_uid"] = None
+    return summary
+
+
+def complete(summary):
+    """True for a summary rebuild() or start() wrote in full, as opposed to one made by incremental writes alone."""
+    return bool(summary) and summary.get("version") == VERSION
+
+
+def start(batch, db, role, uid):
+    """Add a new user's (empty, complete) summary to `batch`."""
+    batch.set(summary_ref(db, role, uid), {**empty(role, uid), "version": VERSION,
+                                           "updated_at": firestore.SERVER_TIMESTAMP})
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _as_datetime(value):
+    if isinstance(value, str):  # ISO strings, e.g. from a JSON round trip
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, datetime.datetime) else None
+
+
+def entry(issue):
+    """The slice of an issue the summaries keep."""
+    created = issue.get("created_at")
+    if not isinstance(created, datetime.datetime):
+        created = _utcnow() if created is firestore.SERVER_TIMESTAMP else None
+    return {"label": issue.get("label"), "status": issue.get("status"), "days": issue.get("days"),
+            "created_at": created, "due_at": deadlines.due_at(issue), "tenant": issue.get("tenant")}
+
+
+def _newest_first(item):
+    issue_id, e = item
+    created = _as_datetime(e.get("created_at"))
+    return (created is None, -created.timestamp() if created else 0.0, issue_id)
+
+
+def _positive(counts):
+    return {k: v for k, v in (counts or {}).items() if v and v > 0}
+
+
+def _bump(counter, key, n):
+    if key is not None:
+        counter[key] = counter.get(key, 0) + n
+
+
+# --- incremental writes ---
+
+def _delta(issue_id, before, after, landlord):
+    """The merge write that moves a summary from issue `before` to `after` (entries; None = absent)."""
+    counts, labels = {}, {}
+    for e, n in ((before, -1), (after, 1)):
+        if e is not None:
+            _bump(counts, e["status"], n)
+            _bump(labels, e["label"], n)
+    counts = {k: firestore.Increment(v) for k, v in counts.items() if v}
+    labels = {k: firestore.Increment(v) for k, v in labels.items() if v}
+
+    # Empty maps are left out: in a merge write they would replace the field
+    write = {"updated_at": firestore.SERVER_TIMESTAMP}
+    if counts:
+        write["counts"] = counts
+        tenant = (after or before)["tenant"]
+        if landlord and tenant:
+            write["tenants"] = {tenant: {"counts": counts}}
+    if labels:
+        write["labels"] = labels
+    is_open = after is not None and after["status"] in OPEN_STATUSES
+    write["open"] = {issue_id: after if is_open else firestore.DELETE_FIELD}
+    write["recent"] = {issue_id: after if after is not None else firestore.DELETE_FIELD}
+    return write
+
+
+def _change_issue(transaction, db, issue_ref, changes, create):
+    snap = issue_ref.get(transaction=transaction)
+    before = snap.to_dict() if snap.exists else None
+    if before is None and not create:
+        return None
+    after = dict(changes) if create else {**before, **changes}
+    if not create and ("days" in changes or changes.get("status") == "resolved"):
+        changes = {**changes, **deadlines.fields(after)}
+
+    tenant_uid = after.get("tenant")
+    landlord_uid = after.get("landlord_uid")
+    if not landlord_uid and tenant_uid:
+        # issues written before landlord_uid was denormalized onto them
+        user = db.collection("users").document(tenant_uid).get(transaction=transaction)
+        landlord_uid = (user.to_dict() or {}).get("landlord_uid") if user.exists else None
+
+    if create:
+        transaction.set(issue_ref, changes)
+    else:
+        transaction.update(issue_ref, changes)
+    old, new = (entry(before) if before else None), entry(after)
+    for role, uid in (("tenant", tenant_uid), ("landlord", landlord_uid)):
+        if uid:
+            transaction.set(summary_ref(db, role, uid), _delta(issue_ref.id, old, new, role == "landlord"),
+                            merge=True)
+    return before
+
+
+def _run(fn, db, *args):
+    # A transactional() wrapper keeps retry state on itself, so build one per call
+    # rather than sharing a decorated function between green threads.
+    return firestore.transactional(fn)(db.transaction(), db, *args)
+
+
+def create_issue(db, issue_ref, data):
+    """Write a new issue and count it in its tenant's and landlord's summaries."""
+    _run(_change_issue, db, issue_ref, data, True)
+
+
+def update_issue(db, issue_ref, changes):
+    """issue_ref.update(changes) plus the summary changes, atomically. Returns the issue before, or None if missing."""
+    return _run(_change_issue, db, issue_ref, changes, False)
+
+
+# --- reading ---
+
+def overdue(summary, now=None):
+    """Open entries whose due date has passed, most overdue first."""
+    now = now or _utcnow()
+    late = [{"id": issue_id, **e} for issue_id, e in (summary.get("open") or {}).items()
+            if (_as_datetime(e.get("due_at")) or now) < now]
+    return sorted(late, key=lambda e: _as_datetime(e["due_at"]))
+
+
+def view(summary):
+    """A stored summary as dashboards use it: zero counts dropped, `recent` as the newest RECENT_N entries."""
+    out = dict(summary)
+    out["counts"] = _positive(summary.get("counts"))
+    out["labels"] = _positive(summary.get("labels"))
+    out["open"] = summary.get("open") or {}
+    out["recent"] = [{"id": issue_id, **e}
+                     for issue_id, e in sorted((summary.get("recent") or {}).items(), key=_newest_first)[:RECENT_N]]
+    if "tenants" in summary:
+        out["tenants"] = {uid: {**t, "counts": _positive(t.get("counts"))} for uid, t in summary["tenants"].items()}
+    return out
+
+
+def _trim_recent(db, role, uid, issue_ids):
+    try:
+        summary_ref(db, role, uid).set({"recent": {i: firestore.DELETE_FIELD for i in issue_ids}}, merge=True)
+    except Exception as e:
+        print(f"[summaries] trimming {role}:{uid} failed: {e}")
+
+
+def for_dashboard(db, role, uid, summary):
+    """view() of a summary a dashboard just read; trims `recent` in the background once it has grown."""
+    if summary is None:
+        return None
+    recent = summary.get("recent") or {}
+    if len(recent) > 2 * RECENT_N:
+        surplus = [issue_id for issue_id, _ in sorted(recent.items(), key=_newest_first)[RECENT_N:]]
+        eventlet.spawn_n(_trim_recent, db, role, uid, surplus)
+    return view(summary)
+
+
+# --- moving tenants ---
+
+def _increments(counter, sign):
+    return {k: firestore.Increment(sign * n) for k, n in (counter or {}).items() if n}
+
+
+def move_tenant(transaction, db, tenant_uid, tenant_email, previous_uid, landlord_uid, issues):
+    """
+    Within the caller's accept transaction: move the tenant from
+    `previous_uid`'s summary (the landlord their user doc pointed at, or
+    None) to `landlord_uid`'s. What moves is folded from `issues`, the
+    tenant's issue snapshots, not read from the tenant's summary, which may
+    be partial. Like issue writes, landlord summaries only get blind merge
+    writes, so tenants of the same landlord accepting at once don't conflict.
+    """
+    now = firestore.SERVER_TIMESTAMP
+    if previous_uid == landlord_uid:
+        transaction.set(summary_ref(db, "landlord", landlord_uid),
+                        {"tenants": {tenant_uid: {"email": tenant_email}}, "updated_at": now}, merge=True)
+        return
+    moved = empty("tenant", tenant_uid)
+    for doc in issues:
+        _fold(moved, doc.id, entry(doc.to_dict() or {}))
+    if previous_uid:
+        gone = {doc.id: firestore.DELETE_FIELD for doc in issues}
+        write = {"tenants": {tenant_uid: firestore.DELETE_FIELD}, "updated_at": now}
+        for field, value in (("counts", _increments(moved["counts"], -1)),
+                             ("labels", _increments(moved["labels"], -1)), ("open", gone), ("recent", gone)):
+            if value:  # empty maps would replace the field in a merge write
+                write[field] = value
+        transaction.set(summary_ref(db, "landlord", previous_uid), write, merge=True)
+
+    recent = dict(sorted(moved["recent"].items(), key=_newest_first)[:RECENT_N])
+    write = {"tenants": {tenant_uid: {"email": tenant_email, "counts": dict(moved["counts"])}},
+             "updated_at": now}
+    for field, value in (("counts", _increments(moved["counts"], 1)),
+                         ("labels", _increments(moved["labels"], 1)),
+                         ("open", moved["open"]), ("recent", recent)):
+        if value:
+            write[field] = value
+    transaction.set(summary_ref(db, "landlord", landlord_uid), write, merge=True)
+    transaction.set(summary_ref(db, "tenant", tenant_uid), {"landlord_uid": landlord_uid, "updated_at": now},
+                    merge=True)
+
+
+def stamp_landlord(db, issues, landlord_uid):
+    """Denormalize landlord_uid onto the tenant's issues (snapshots) that don't carry it yet."""
+    stamps = [(doc.reference, {"landlord_uid": landlord_uid})
+              for doc in issues if doc.to_dict().get("landlord_uid") != landlord_uid]
+    errors = [e for e in set_in_batches(db, stamps, merge=True) if e is not None]
+    if errors:
+        print(f"[summaries] landlord_uid not stamped on {len(errors)} of {len(stamps)} issues: {errors[0]}")
+
+
+# --- rebuild ---
+
+def _fold(summary, issue_id, e):
+    _bump(summary["counts"], e["status"], 1)
+    _bump(summary["labels"], e["label"], 1)
+    tenant = summary.get("tenants", {}).get(e["tenant"])
+    if tenant is not None:
+        _bump(tenant["counts"], e["status"], 1)
+    if e["status"] in OPEN_STATUSES:
+        summary["open"][issue_id] = e
+    summary["recent"][issue_id] = e
+
+
+def rebuild(db):
+    """
+    Recompute every summary from users and issues, stamping landlord_uid on
+    issues that lack it. Returns (summaries written, issues stamped).
+    """
+    summaries = {}
+    landlord_of = {}
+    for doc in db.collection("users").stream():
+        user = doc.to_dict() or {}
+        if user.get("role") == "landlord":
+            summaries.setdefault(("landlord", doc.id), empty("landlord", doc.id))
+        elif user.get("role") == "tenant":
+            tenant = summaries.setdefault(("tenant", doc.id), empty("tenant", doc.id))
+            landlord_uid = user.get("landlord_uid")
+            tenant["landlord_uid"] = landlord_uid
+            if landlord_uid:
+                landlord_of[doc.id] = landlord_uid
+                landlord = summaries.setdefault(("landlord", landlord_uid), empty("landlord", landlord_uid))
+                landlord["tenants"][doc.id] = {"email": user.get("email") or user.get("username"), "counts": {}}
+
+    stamps = []
+    for doc in db.collection("issues").stream():
+        issue = doc.to_dict() or {}
+        tenant_uid = issue.get("tenant")
+        landlord_uid = landlord_of.get(tenant_uid)
+        if landlord_uid and issue.get("landlord_uid") != landlord_uid:
+            stamps.append((doc.reference, {"landlord_uid": landlord_uid}))
+        e = entry(issue)
+        for key in (("tenant", tenant_uid), ("landlord", landlord_uid)):
+            if key[1]:
+                _fold(summaries.setdefault(key, empty(*key)), doc.id, e)
+
+    now = _utcnow()
+    writes = []
+    for (role, uid), summary in summaries.items():
+        summary["recent"] = dict(sorted(summary["recent"].items(), key=_newest_first)[:RECENT_N])
+        writes.append((summary_ref(db, role, uid), {**summary, "version": VERSION, "updated_at": now}))
+    errors = [e for e in set_in_batches(db, stamps, merge=True) + set_in_batches(db, writes) if e is not None]
+    if errors:
+        raise RuntimeError(f"{len(errors)} writes failed, first: {errors[0]}")
+    return len(writes), len(stamps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m api.summaries", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="recompute all summaries from the issues collection")
+    parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from . import clients
+
+    load_dotenv()
+    written, stamped = rebuild(clients.get("firestore"))
+    print(f"[summaries] rebuilt {written} summaries, stamped landlord_uid on {stamped} issues")
+
+
+if __name__ == "__main__":
+    main()
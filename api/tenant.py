@@ -1,63 +1,88 @@
-import os
+import time
 from flask import Blueprint, render_template, redirect, url_for, session, flash, jsonify, request, current_app, send_file, abort
 from io import BytesIO
-from docx import Document
 from firebase_admin import firestore
-from inference_sdk import InferenceHTTPClient
+from .loader import get_loader
+from .queries import to_doc
+from . import profiles
+from . import reports
+from . import summaries
 
 tenant_bp = Blueprint("tenant", __name__, template_folder="templates")
 
 def get_db():
     return current_app.config["DB"]
 
-rf_client = InferenceHTTPClient(
-    api_url="https://detect.roboflow.com",
-    api_key=os.getenv("ROBOFLOW_API_KEY"),
-)
+def _tenant_dashboard_state(tenant_uid, tenant_email):
+    """
+    {"issues", "requests", "resolved_total"}: issues come from the tenant's
+    summary document (open issues plus the most recent resolved ones). Until
+    the summary is complete (see summaries.complete), every issue is read
+    instead.
+    """
+    db = get_db()
+    load = get_loader()
+    # The two reads are independent: start them together, then collect.
+    requests_read = load.query("requests", db.collection("requests")
+                               .where("tenant_email", "==", tenant_email)
+                               .where("status", "==", "pending").get)
+    summary = load.doc_dict("summaries", f"tenant:{tenant_uid}")
+    if summaries.complete(summary):
+        summary = summaries.for_dashboard(db, "tenant", tenant_uid, summary)
+        entries = [{**e, "id": issue_id} for issue_id, e in summary["open"].items()]
+        entries += [e for e in summary["recent"] if e.get("status") == "resolved"]
+        issues = [to_doc(e["id"], e) for e in entries]
+        resolved_total = summary["counts"].get("resolved", 0)
+    else:
+        issues_read = load.query("issues", db.collection("issues").where("tenant", "==", tenant_uid).get)
+        issues = [to_doc(doc.id, doc.to_dict()) for doc in issues_read.wait()]
+        resolved_total = None
+    return {
+        "requests": [to_doc(doc.id, doc.to_dict()) for doc in requests_read.wait()],
+        "issues": issues,
+        "resolved_total": resolved_total,
+    }
 
 @tenant_bp.route("/tenant/dashboard")
 def tenant_dashboard():
     if "username" not in session or session.get("role") != "tenant":
         return redirect(url_for("auth.login"))
     
-    tenant_email = session.get("username")
-    tenant_uid = session.get("uid")
-    
-    requests_query = get_db().collection("requests") \
-        .where("tenant_email", "==", tenant_email) \
-        .where("status", "==", "pending") \
-        .get()
-    requests_list = []
-    for doc in requests_query:
-        req = doc.to_dict()
-        req["id"] = doc.id
-        requests_list.append(req)
+    state = _tenant_dashboard_state(session.get("uid"), session.get("username"))
+    issues_list = sorted(state["issues"], key=lambda i: i.get("created_at") or "")
     
-    issues_query = get_db().collection("issues") \
-        .where("tenant", "==", tenant_uid) \
-        .get()
-    issues_list = []
-    for doc in issues_query:
-        issue = doc.to_dict()
-        issue["id"] = doc.id
-        issues_list.append(issue)
-    
-    pending_issues = [issue for issue in issues_list if issue.get("status") == "pending"]
+    # "generating"/"failed" issues are open too; the AI letter is still being produced or needs a retry
+    pending_issues = [issue for issue in issues_list if issue.get("status") in ("pending", "generating", "failed")]
     resolved_issues = [issue for issue in issues_list if issue.get("status") == "resolved"]
     
-    tenant_doc = get_db().collection("users").document(tenant_uid).get().to_dict()
-    current_landlord = tenant_doc.get("landlord") if tenant_doc and "landlord" in tenant_doc else None
-    current_landlord_uid = tenant_doc.get("landlord_uid") if tenant_doc and "landlord_uid" in tenant_doc else None
+    tenant_profile = profiles.session_profile()
+    current_landlord = tenant_profile.get("landlord")
+    current_landlord_uid = tenant_profile.get("landlord_uid")
     
     return render_template(
         "tenant_dashboard.html",
-        requests=requests_list,
+        requests=state["requests"],
         current_landlord=current_landlord,
         current_landlord_uid=current_landlord_uid,
         pending_issues=pending_issues,
         resolved_issues=resolved_issues,
+        resolved_total=state["resolved_total"],
     )
 
+def _can_read_issue(issue_data):
+    """The issue's tenant, or a landlord the tenant is attached to."""
+    uid = session.get("uid")
+    if not uid:
+        return False
+    if issue_data.get("tenant") == uid:
+        return True
+    if session.get("role") != "landlord":
+        return False
+    if issue_data.get("landlord_uid") == uid:
+        return True
+    link = get_db().collection("users").document(uid).collection("tenants").document(issue_data.get("tenant") or "-").get()
+    return link.exists
+
 @tenant_bp.route("/tenant/download_report/<issue_id>")
 def download_report(issue_id):
     issue_ref = get_db().collection("issues").document(issue_id)
@@ -65,23 +90,36 @@ def download_report(issue_id):
     if not issue.exists:
         abort(404, description="Issue not found.")
     issue_data = issue.to_dict()
+    if not _can_read_issue(issue_data):
+        abort(403, description="Not authorized.")
     
     ai_advice = issue_data.get("ai_advice")
     if not ai_advice:
         abort(404, description="Legal report not available for this issue.")
     
-    document = Document()
-    document.add_paragraph(ai_advice)
-    file_stream = BytesIO()
-    document.save(file_stream)
-    file_stream.seek(0)
-    
-    return send_file(
-        file_stream,
+    # Rendered once per content hash; the hash is the ETag, so repeat downloads can be 304s
+    data, etag, rendered_at = reports.get_report(issue_id, issue_data)
+    resp = send_file(
+        BytesIO(data),
         as_attachment=True,
         download_name="legal_report.docx",
-        mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        mimetype=reports.DOCX_MIMETYPE,
+        etag=etag,
+        last_modified=rendered_at,
+        conditional=True,
     )
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+@tenant_bp.route("/tenant/reports.zip")
+def export_reports():
+    """Every legal report of the logged-in tenant in one zip."""
+    if "username" not in session or session.get("role") != "tenant":
+        return redirect(url_for("auth.login"))
+    docs = get_db().collection("issues").where("tenant", "==", session.get("uid")).get()
+    entries = [(reports.report_filename(doc.id, issue), doc.id, issue)
+               for doc, issue in ((d, d.to_dict()) for d in docs) if issue.get("ai_advice")]
+    return reports.zip_response(entries, "legal-reports.zip")
 
 @tenant_bp.route("/tenant/solve_issue/<issue_id>", methods=["POST"])
 def solve_issue(issue_id):
@@ -100,7 +138,7 @@ def solve_issue(issue_id):
         if issue_data.get("tenant") != tenant_uid:
             return jsonify({"success": False, "error": "Not authorized"}), 403
 
-        issue_ref.update({"status": "resolved"})
+        summaries.update_issue(get_db(), issue_ref, {"status": "resolved"})
 
         return redirect(url_for("tenant.tenant_dashboard"))
     except Exception as e:
@@ -110,46 +148,134 @@ def solve_issue(issue_id):
 def tenant_chat():
     if "username" not in session or session.get("role") != "tenant":
         return redirect(url_for("auth.login"))
-    tenant_uid = session.get("uid")
-    tenant_doc = get_db().collection("users").document(tenant_uid).get().to_dict()
-    current_landlord = tenant_doc.get("landlord") if tenant_doc and "landlord" in tenant_doc else None
-    current_landlord_uid = tenant_doc.get("landlord_uid") if tenant_doc and "landlord_uid" in tenant_doc else None
+    tenant_profile = profiles.session_profile()
+    current_landlord = tenant_profile.get("landlord")
+    current_landlord_uid = tenant_profile.get("landlord_uid")
     return render_template("tenant_chat.html", current_landlord=current_landlord,
                            current_landlord_uid=current_landlord_uid)
 
+def _newest(item):
+    sent = item[1].get("timestamp")
+    return (sent is not None, sent or 0)
+
+def _accept(transaction, db, tenant_uid, tenant_email, request_refs):
+    """
+    Attach the tenant to the landlord of the newest pending request among
+    `request_refs`, in one transaction: that landlord's requests become
+    "accepted" and other landlords' "superseded", the landlord's tenants link
+    is written (and a previous landlord's removed), the tenant's user doc
+    points at the new landlord and the dashboard summaries move with them.
+    The user doc and requests are read in one get_all; reading the user doc
+    serializes concurrent accepts by the same tenant, and its landlord_uid is
+    the previous landlord everywhere below. A request this tenant already
+    accepted is reported as such.
+    """
+    user_ref = db.collection("users").document(tenant_uid)
+    snaps = {snap.reference.path: snap
+             for snap in db.get_all([user_ref, *request_refs], transaction=transaction)}
+    found = [(ref, snaps[ref.path].to_dict()) for ref in request_refs if snaps[ref.path].exists]
+    mine = [(ref, req) for ref, req in found if req.get("tenant_email") == tenant_email]
+    pending = [(ref, req) for ref, req in mine if req.get("status") == "pending" and req.get("landlord_uid")]
+    if not pending:
+        accepted = [ref.id for ref, req in mine if req.get("status") == "accepted" and req.get("accepted_by") == tenant_uid]
+        return {"outcome": "already_accepted" if accepted else ("unavailable" if found else "not_found"),
+                "accepted": accepted, "superseded": []}
+
+    chosen_ref, chosen = max(pending, key=_newest)
+    landlord_uid = chosen["landlord_uid"]
+    # Not transactional: what the landlord summaries move is folded from these (see summaries.move_tenant)
+    issues = db.collection("issues").where("tenant", "==", tenant_uid).get()
+    accepted, superseded = [], []
+    for ref, req in pending:
+        if req["landlord_uid"] == landlord_uid:
+            transaction.update(ref, {"status": "accepted", "accepted_by": tenant_uid,
+                                     "accepted_at": firestore.SERVER_TIMESTAMP})
+            accepted.append(ref.id)
+        else:
+            transaction.update(ref, {"status": "superseded", "superseded_by": chosen_ref.id})
+            superseded.append(ref.id)
+
+    user = snaps[user_ref.path].to_dict() or {}
+    previous = user.get("landlord_uid")
+    if previous and previous != landlord_uid:
+        transaction.delete(db.collection("users").document(previous).collection("tenants").document(tenant_uid))
+    transaction.set(db.collection("users").document(landlord_uid).collection("tenants").document(tenant_uid), {
+        "email": tenant_email,
+        "attached_at": firestore.SERVER_TIMESTAMP,
+    })
+    attachment = {"landlord": chosen.get("landlord_email"), "landlord_uid": landlord_uid}
+    transaction.update(user_ref, attachment)
+    summaries.move_tenant(transaction, db, tenant_uid, tenant_email, previous, landlord_uid, issues)
+    return {"outcome": "accepted", "attachment": attachment, "previous_landlord_uid": previous,
+            "accepted": accepted, "superseded": superseded, "issues": issues}
+
+def _accept_requests(request_refs):
+    """Run _accept for the session tenant, then stamp their issues and refresh their profile."""
+    db = get_db()
+    tenant_uid, tenant_email = session.get("uid"), session.get("username")
+    t0 = time.perf_counter()
+    # transactional() keeps retry state on the wrapper, so build one per call
+    result = firestore.transactional(_accept)(db.transaction(), db, tenant_uid, tenant_email, request_refs)
+    if result["outcome"] == "accepted":
+        summaries.stamp_landlord(db, result.pop("issues"), result["attachment"]["landlord_uid"])
+        profiles.invalidate(tenant_uid)
+        profiles.remember({**profiles.session_profile(), **result["attachment"]})
+    result["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    print(f"[accept] tenant={tenant_uid} {result['outcome']} accepted={len(result['accepted'])} "
+          f"superseded={len(result['superseded'])} in {result['elapsed_ms']}ms")
+    return result
+
+_ACCEPT_FLASH = {
+    "accepted": ("Request accepted. You are now attached to your landlord.", "success"),
+    "already_accepted": ("Request already accepted.", "info"),
+    "unavailable": ("Request is no longer available or invalid.", "warning"),
+    "not_found": ("Request not found.", "danger"),
+    "none_pending": ("No pending requests.", "info"),
+}
+
+def _accept_response(result):
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"success": result["outcome"] in ("accepted", "already_accepted"), **result})
+    message, category = _ACCEPT_FLASH[result["outcome"]]
+    if result["superseded"]:
+        message += f" {len(result['superseded'])} invitation(s) from other landlords were declined."
+    flash(message, category)
+    return redirect(url_for("tenant.tenant_dashboard"))
+
+def _accept_error(e):
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"success": False, "error": str(e)}), 500
+    flash(f"Error accepting request: {e}", "danger")
+    return redirect(url_for("tenant.tenant_dashboard"))
+
 @tenant_bp.route("/accept-request/<request_id>")
 def accept_request(request_id):
-    if "username" in session and session.get("role") == "tenant":
-        tenant_email = session.get("username")
-        tenant_uid = session.get("uid")
-        try:
-            request_ref = get_db().collection("requests").document(request_id)
-            request_doc = request_ref.get()
-            if request_doc.exists:
-                req_data = request_doc.to_dict()
-                if req_data.get("tenant_email") == tenant_email and req_data.get("status") == "pending":
-                    request_ref.update({"status": "accepted"})
-                    landlord_uid = req_data.get("landlord_uid")
-                    if not landlord_uid:
-                        flash("Landlord UID missing in request.", "danger")
-                        return redirect(url_for("tenant.tenant_dashboard"))
-                    get_db().collection("users").document(landlord_uid) \
-                        .collection("tenants").document(tenant_uid).set({
-                            "email": tenant_email,
-                            "attached_at": firestore.SERVER_TIMESTAMP,
-                        })
-                    get_db().collection("users").document(tenant_uid).update({
-                        "landlord": req_data.get("landlord_email"),
-                        "landlord_uid": landlord_uid,
-                    })
-                    flash("Request accepted. You are now attached to your landlord.", "success")
-                else:
-                    flash("Request is no longer available or invalid.", "warning")
-            else:
-                flash("Request not found.", "danger")
-        except Exception as e:
-            flash(f"Error accepting request: {e}", "danger")
-        return redirect(url_for("tenant.tenant_dashboard"))
-    flash("Unauthorized access", "danger")
-    return redirect(url_for("auth.login"))
+    """Accept one invitation. Safe to repeat: a second click reports it as already accepted."""
+    if "username" not in session or session.get("role") != "tenant":
+        flash("Unauthorized access", "danger")
+        return redirect(url_for("auth.login"))
+    try:
+        return _accept_response(_accept_requests([get_db().collection("requests").document(request_id)]))
+    except Exception as e:
+        return _accept_error(e)
 
+@tenant_bp.route("/accept-requests", methods=["POST"])
+def accept_all_requests():
+    """
+    Accept every pending invitation at once. A tenant has one landlord, so
+    the newest invitation's landlord wins; pending invitations from other
+    landlords are marked superseded.
+    """
+    if "username" not in session or session.get("role") != "tenant":
+        flash("Unauthorized access", "danger")
+        return redirect(url_for("auth.login"))
+    try:
+        db = get_db()
+        pending = db.collection("requests") \
+            .where("tenant_email", "==", session.get("username")) \
+            .where("status", "==", "pending").get()
+        if not pending:
+            return _accept_response({"outcome": "none_pending", "accepted": [], "superseded": []})
+        return _accept_response(_accept_requests([doc.reference for doc in pending]))
+    except Exception as e:
+        return _accept_error(e)
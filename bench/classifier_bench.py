@@ -0,0 +1,98 @@
+"""
+Compare classifier backends on the images in static/uploads.
+
+    python bench/classifier_bench.py --requests 200 --concurrency 8
+    python bench/classifier_bench.py --backends local     # skip the network
+
+The local backend needs CLASSIFIER_MODEL_PATH (+ CLASSIFIER_LABELS); the remote
+backend needs ROBOFLOW_API_KEY. Unavailable backends are skipped.
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api.imaging import prepare_for_inference
+from api.classifier import LocalClassifier, RemoteClassifier, _load_labels
+
+
+def load_images(max_side):
+    paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(ROOT, "static", "uploads", f"*.{ext}")))
+    return [prepare_for_inference(open(p, "rb").read(), max_side=max_side)[0] for p in paths]
+
+
+def make_backend(name):
+    if name == "local":
+        return LocalClassifier(os.environ["CLASSIFIER_MODEL_PATH"], _load_labels(os.getenv("CLASSIFIER_LABELS")),
+                               normalize=os.getenv("CLASSIFIER_NORMALIZE", "unit"))
+    if name == "remote":
+        from inference_sdk import InferenceHTTPClient
+        if not os.getenv("ROBOFLOW_API_KEY"):
+            raise RuntimeError("ROBOFLOW_API_KEY is not set")
+        return RemoteClassifier(InferenceHTTPClient(api_url="https://serverless.roboflow.com",
+                                                    api_key=os.getenv("ROBOFLOW_API_KEY")))
+    raise ValueError(name)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(backend, images, requests, concurrency):
+    backend.classify(images[0])  # warm connection / model
+    latencies = []
+
+    def one(i):
+        t0 = time.perf_counter()
+        backend.classify(images[i % len(images)])
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    pool = eventlet.GreenPool(concurrency)
+    t0 = time.perf_counter()
+    for i in range(requests):
+        pool.spawn_n(one, i)
+    pool.waitall()
+    wall = time.perf_counter() - t0
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.mean(latencies),
+        "throughput": requests / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--backends", default="local,remote")
+    parser.add_argument("--input-size", type=int, default=int(os.getenv("RF_INPUT_SIZE", "640")))
+    args = parser.parse_args()
+
+    images = load_images(args.input_size)
+    if not images:
+        sys.exit("no images found in static/uploads")
+    print(f"{len(images)} image(s), {args.requests} requests, concurrency {args.concurrency}\n")
+    print(f"{'backend':<8} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'img/s':>9}")
+    for name in args.backends.split(","):
+        try:
+            backend = make_backend(name.strip())
+        except Exception as e:
+            print(f"{name:<8} skipped: {e}")
+            continue
+        r = run(backend, images, args.requests, args.concurrency)
+        extra = f"  ({backend.batches} batches)" if isinstance(backend, LocalClassifier) else ""
+        print(f"{name:<8} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['mean_ms']:>9.1f} {r['throughput']:>9.1f}{extra}")
+
+
+if __name__ == "__main__":
+    main()
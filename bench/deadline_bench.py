@@ -0,0 +1,115 @@
+"""
+Deadline scheduler cost per tick versus total issue count.
+
+Seeds FakeFirestore with --sizes issues, of which a fixed --due are coming
+due during the simulated --hours (the rest are due months out or resolved),
+then drives api.deadlines.DeadlineScheduler on a simulated clock: load()
+every --reload-sec, tick() every --tick-sec. For each size it reports
+
+    docs/load   documents the horizon query returns (what Firestore reads and bills)
+    tick us     scheduler time per tick, mean and p99 (heap pops + claims + notify)
+    fired       notifications sent
+    scan docs   documents a "scan every open issue" tick would read instead
+
+    python bench/deadline_bench.py
+    python bench/deadline_bench.py --sizes 1000,100000 --due 500 --hours 12
+
+FakeFirestore evaluates queries by scanning, so the time of load() itself is
+not reported; Firestore serves the range query from the deadline_next_at
+index in time proportional to the documents returned.
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes
+from api.deadlines import DeadlineScheduler
+
+T0 = datetime.datetime(2026, 1, 5, 9, 0, tzinfo=datetime.timezone.utc)
+
+
+def seed(db, size, due, hours, rng):
+    """`due` issues come due within the simulated window; the rest never do."""
+    window = hours * 3600
+    open_issues = 0
+    for i in range(size):
+        issue = {"tenant": f"tenant-{i % 997}", "landlord_uid": f"landlord-{i % 97}", "label": "Mould",
+                 "days": 14, "created_at": T0 - datetime.timedelta(days=14)}
+        if i < due:
+            when = T0 + datetime.timedelta(seconds=rng.uniform(0, window))
+            issue.update(status="pending", due_at=when, deadline_stage="overdue", deadline_next_at=when)
+        elif rng.random() < 0.7:
+            when = T0 + datetime.timedelta(days=rng.uniform(2, 365))
+            issue.update(status="pending", due_at=when, deadline_stage="due_soon",
+                         deadline_next_at=when - datetime.timedelta(days=1))
+        else:
+            issue.update(status="resolved", due_at=T0 - datetime.timedelta(days=rng.uniform(1, 365)))
+        open_issues += issue["status"] == "pending"
+        db.seed(f"issues/issue-{i:06d}", issue)
+    return open_issues
+
+
+def run(size, args):
+    rng = random.Random(args.seed)
+    db = fakes.FakeFirestore()
+    open_issues = seed(db, size, args.due, args.hours, rng)
+
+    now = [T0]
+    fired = []
+    scheduler = DeadlineScheduler(db, lambda stage, issue_id, issue: fired.append(issue_id),
+                                  horizon=args.horizon_sec, reload_every=args.reload_sec, clock=lambda: now[0])
+    loads, ticks = [], []
+    steps = int(args.hours * 3600 / args.tick_sec)
+    per_load = max(1, int(args.reload_sec / args.tick_sec))
+    for step in range(steps + 1):
+        now[0] = T0 + datetime.timedelta(seconds=step * args.tick_sec)
+        if step % per_load == 0:
+            loads.append(scheduler.load())
+        t0 = time.perf_counter()
+        scheduler.tick(wait=True)
+        ticks.append((time.perf_counter() - t0) * 1e6)
+
+    ticks.sort()
+    return {
+        "size": size,
+        "docs_per_load": statistics.mean(loads),
+        "tick_mean_us": statistics.mean(ticks),
+        "tick_p99_us": ticks[min(len(ticks) - 1, int(0.99 * len(ticks)))],
+        "fired": len(fired),
+        "commits": db.rpcs["transaction.commit"],
+        "scan_docs": open_issues,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--due", type=int, default=300, help="issues coming due during the run")
+    parser.add_argument("--hours", type=float, default=6)
+    parser.add_argument("--tick-sec", type=float, default=30)
+    parser.add_argument("--reload-sec", type=float, default=300)
+    parser.add_argument("--horizon-sec", type=float, default=900)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.due} issues due over {args.hours:g}h, tick {args.tick_sec:g}s, "
+          f"load every {args.reload_sec:g}s with a {args.horizon_sec:g}s horizon")
+    print(f"{'issues':>8} {'docs/load':>10} {'tick us':>9} {'p99 us':>9} {'fired':>6} {'commits':>8} {'scan docs':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        r = run(size, args)
+        print(f"{r['size']:>8} {r['docs_per_load']:>10.1f} {r['tick_mean_us']:>9.1f} {r['tick_p99_us']:>9.1f} "
+              f"{r['fired']:>6} {r['commits']:>8} {r['scan_docs']:>10}")
+
+
+if __name__ == "__main__":
+    main()
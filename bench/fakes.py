@@ -0,0 +1,548 @@
+"""
+In-process stand-ins for the app's external services, for benchmarks.
+
+FakeFirestore       - in-memory Firestore covering the client surface the app
+                      uses (docs, subcollections, where/order_by/limit,
+                      count(), get_all, batches, transactions,
+                      SERVER_TIMESTAMP/Increment/ArrayUnion) with injectable
+                      per-RPC latency
+FakeGenai           - google.genai.Client look-alike (generate_content and
+                      generate_content_stream)
+FakeRoboflow        - inference_sdk.InferenceHTTPClient look-alike
+FakeIdentityToolkit - requests.Session look-alike answering signInWithPassword
+
+Latencies are milliseconds, slept with eventlet so they cost wall time but
+not CPU - the same shape as a network round-trip. bench/smtp_sink.py covers
+SMTP. bench/load.py wires all of these into api.index.
+"""
+import zlib
+import uuid
+import random
+import datetime
+import threading
+from collections import Counter
+
+import eventlet
+from google.api_core.exceptions import Aborted
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP, DELETE_FIELD
+from google.cloud.firestore_v1.transforms import Increment, ArrayUnion, ArrayRemove
+
+
+class Latency:
+    def __init__(self, ms=0.0, jitter_ms=0.0, seed=None):
+        self.ms = ms
+        self.jitter_ms = jitter_ms
+        self._rand = random.Random(seed)
+
+    def sleep(self):
+        delay = self.ms + (self._rand.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            eventlet.sleep(delay / 1000.0)
+
+
+# --- Firestore ---
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _get_path(data, dotted):
+    value = data
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _order_value(doc, field):
+    doc_id, data = doc
+    return doc_id if field == "__name__" else _get_path(data, field)
+
+
+def _apply(current, key, value, merge=False):
+    """
+    Set dotted `key` in `current`, resolving Firestore sentinels/transforms.
+    With merge (set(..., merge=True)) nested maps are merged, not replaced.
+    """
+    parts = key.split(".")
+    target = current
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    leaf = parts[-1]
+    if value is DELETE_FIELD:
+        target.pop(leaf, None)
+    elif value is SERVER_TIMESTAMP:
+        target[leaf] = _now()
+    elif isinstance(value, Increment):
+        target[leaf] = (target.get(leaf) or 0) + value.value
+    elif isinstance(value, ArrayUnion):
+        existing = list(target.get(leaf) or [])
+        target[leaf] = existing + [v for v in value.values if v not in existing]
+    elif isinstance(value, ArrayRemove):
+        target[leaf] = [v for v in (target.get(leaf) or []) if v not in value.values]
+    elif isinstance(value, dict):
+        if not (merge and isinstance(target.get(leaf), dict)):
+            target[leaf] = {}
+        for k, v in value.items():
+            _apply(target[leaf], k, v, merge)
+    else:
+        target[leaf] = value
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _get_path(self._data or {}, field)
+
+
+def _copy(data):
+    return {k: _copy(v) if isinstance(v, dict) else (list(v) if isinstance(v, list) else v)
+            for k, v in data.items()}
+
+
+class FakeDocumentReference:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._db, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def get(self, *args, transaction=None, **kwargs):
+        self._db._rpc("doc.get")
+        if transaction is not None:
+            transaction._record_read(self.path)
+        return FakeSnapshot(self, self._db._read(self.path))
+
+    def set(self, data, merge=False):
+        self._db._rpc("doc.set")
+        self._db._write(self.path, data, merge=merge)
+
+    def create(self, data):
+        self._db._rpc("doc.create")
+        if self._db._read(self.path) is not None:
+            raise ValueError(f"Document already exists: {self.path}")
+        self._db._write(self.path, data)
+
+    def update(self, data):
+        self._db._rpc("doc.update")
+        self._db._update(self.path, data)
+
+    def delete(self):
+        self._db._rpc("doc.delete")
+        self._db._delete(self.path)
+
+    def on_snapshot(self, callback):
+        return self._db._watch(self, callback)
+
+
+class _Aggregate:
+    def __init__(self, value):
+        self.alias = "count"
+        self.value = value
+
+
+class _CountQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def get(self, *args, **kwargs):
+        self._query._db._rpc("aggregate.get")
+        return [[_Aggregate(len(self._query._matches()))]]
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a is not None and a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a is not None and a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+
+
+class FakeQuery:
+    def __init__(self, db, path, filters=(), orders=(), limit=None, start_after=None):
+        self._db = db
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._start_after = start_after
+
+    def _clone(self, **changes):
+        args = {"filters": self._filters, "orders": self._orders, "limit": self._limit,
+                "start_after": self._start_after}
+        args.update(changes)
+        return FakeQuery(self._db, self._path, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:  # FieldFilter(field, op, value)
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string in ("in", "not-in", "array_contains_any") and len(value) > 30:
+            raise ValueError(f"'{op_string}' filters support at most 30 values")
+        return self._clone(filters=self._filters + ((field_path, _OPS[op_string], value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._clone(orders=self._orders + ((field_path, direction == "DESCENDING"),))
+
+    def limit(self, count):
+        return self._clone(limit=count)
+
+    def start_after(self, fields):
+        """fields: {order field: value}, for a prefix of the order_by fields ("__name__" is the document id)."""
+        return self._clone(start_after=fields)
+
+    def count(self, alias=None):
+        return _CountQuery(self)
+
+    def _matches(self):
+        docs = [(doc_id, data) for doc_id, data in self._db._collection(self._path)
+                if all(op(_get_path(data, field), value) for field, op, value in self._filters)]
+        for field, descending in reversed(self._orders):
+            docs = [d for d in docs if _order_value(d, field) is not None]
+            docs.sort(key=lambda d: _order_value(d, field), reverse=descending)
+        if not self._orders:
+            docs.sort(key=lambda d: d[0])
+        if self._start_after is not None:
+            docs = [d for d in docs if self._after_cursor(d)]
+        return docs[:self._limit] if self._limit is not None else docs
+
+    def _after_cursor(self, doc):
+        for field, descending in self._orders:
+            if field not in self._start_after:
+                break
+            value, cursor = _order_value(doc, field), self._start_after[field]
+            if value != cursor:
+                return value < cursor if descending else value > cursor
+        return False
+
+    def get(self, *args, **kwargs):
+        self._db._rpc("query.get")
+        return [FakeSnapshot(FakeDocumentReference(self._db, f"{self._path}/{doc_id}"), data)
+                for doc_id, data in self._matches()]
+
+    def stream(self, *args, **kwargs):
+        return iter(self.get())
+
+    def on_snapshot(self, callback):
+        return self._db._watch(self, callback)
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._db, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(data)
+        return _now(), ref
+
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: self._db._write(ref.path, data, merge=merge))
+
+    def create(self, ref, data):
+        self._ops.append(lambda: self._db._write(ref.path, data))
+
+    def update(self, ref, data):
+        self._ops.append(lambda: self._db._update(ref.path, data))
+
+    def delete(self, ref):
+        self._ops.append(lambda: self._db._delete(ref.path))
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise ValueError("A write batch can contain at most 500 operations")
+        self._db._rpc("batch.commit")
+        with self._db._lock:
+            for op in self._ops:
+                op()
+        self._ops = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    db.transaction() for firestore.transactional. Optimistic: commit raises
+    Aborted (which transactional retries) if a document read through
+    ref.get(transaction=...) was written after it was read.
+    """
+
+    def __init__(self, db, max_attempts=5, read_only=False):
+        super().__init__(db)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}
+
+    def _record_read(self, path):
+        with self._db._lock:
+            self._reads.setdefault(path, self._db._versions.get(path, 0))
+
+    def _clean_up(self):
+        self._ops = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        self._db._rpc("transaction.commit")
+        try:
+            with self._db._lock:
+                for path, version in self._reads.items():
+                    if self._db._versions.get(path, 0) != version:
+                        self._db.aborts += 1
+                        raise Aborted(f"{path} changed during the transaction")
+                for op in self._ops:
+                    op()
+        finally:
+            self._clean_up()
+        return []
+
+
+class _Watch:
+    def __init__(self, db, target, callback):
+        self._db = db
+        self.target = target
+        self.callback = callback
+
+    def unsubscribe(self):
+        self._db._watches.discard(self)
+
+
+class FakeFirestore:
+    """Drop-in for firestore.client() in benchmarks. `rpcs` counts calls by op."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, seed=0):
+        self.latency = Latency(latency_ms, jitter_ms, seed)
+        self._docs = {}  # collection path -> {doc_id: data}
+        self._lock = threading.RLock()
+        self._watches = set()
+        self._versions = Counter()  # path -> writes, for transaction conflict checks
+        self.rpcs = Counter()
+        self.aborts = 0
+
+    def _rpc(self, op):
+        self.rpcs[op] += 1
+        self.latency.sleep()
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def document(self, path):
+        return FakeDocumentReference(self, path)
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        """Many documents in one round-trip, like the real client's batched get."""
+        references = list(references)
+        self._rpc("get_all")
+        snaps = []
+        for ref in references:
+            if transaction is not None:
+                transaction._record_read(ref.path)
+            snaps.append(FakeSnapshot(ref, self._read(ref.path)))
+        return iter(snaps)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self, **kwargs)
+
+    def seed(self, path, data):
+        """Write without latency (fixtures)."""
+        self._write(path, data)
+
+    # storage
+
+    def _collection(self, path):
+        with self._lock:
+            return list(self._docs.get(path, {}).items())
+
+    def _read(self, path):
+        coll, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            data = self._docs.get(coll, {}).get(doc_id)
+            return _copy(data) if data is not None else None
+
+    def _write(self, path, data, merge=False):
+        coll, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            docs = self._docs.setdefault(coll, {})
+            current = docs.get(doc_id) if merge else None
+            current = _copy(current) if current else {}
+            for key, value in data.items():
+                _apply(current, key, value, merge)
+            docs[doc_id] = current
+            self._versions[path] += 1
+        self._notify(path)
+
+    def _update(self, path, data):
+        coll, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            current = self._docs.get(coll, {}).get(doc_id)
+            if current is None:
+                raise ValueError(f"No document to update: {path}")
+            current = _copy(current)
+            for key, value in data.items():
+                _apply(current, key, value)
+            self._docs[coll][doc_id] = current
+            self._versions[path] += 1
+        self._notify(path)
+
+    def _delete(self, path):
+        coll, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            self._docs.get(coll, {}).pop(doc_id, None)
+            self._versions[path] += 1
+        self._notify(path)
+
+    # listeners: callbacks get the full current result (no change sets)
+
+    def _watch(self, target, callback):
+        watch = _Watch(self, target, callback)
+        self._watches.add(watch)
+        eventlet.spawn_n(self._fire, watch)
+        return watch
+
+    def _fire(self, watch):
+        target = watch.target
+        if isinstance(target, FakeDocumentReference):
+            snaps = [FakeSnapshot(target, self._read(target.path))]
+        else:
+            snaps = [FakeSnapshot(FakeDocumentReference(self, f"{target._path}/{i}"), d) for i, d in target._matches()]
+        watch.callback(snaps, [], _now())
+
+    def _notify(self, path):
+        coll = path.rsplit("/", 1)[0]
+        for watch in list(self._watches):
+            target = watch.target
+            hit = target.path == path if isinstance(target, FakeDocumentReference) else target._path == coll
+            if hit:
+                eventlet.spawn_n(self._fire, watch)
+
+
+# --- Gemini ---
+
+class _GenaiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def _answer(self, contents):
+        prompt = " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in contents)
+        if "ONE INTEGER" in prompt:
+            return "14"
+        return ("Dear Landlord,\n\nI, [TENANT_NAME], am writing to formally notify you of an issue at my "
+                "rental unit that requires repair under applicable state law. " * 8
+                + "\n\nSincerely,\n[TENANT_NAME]")
+
+    def generate_content(self, model, contents, config=None):
+        self._owner.calls += 1
+        self._owner.latency.sleep()
+        return _GenaiResponse(self._answer(contents))
+
+    def generate_content_stream(self, model, contents, config=None):
+        self._owner.calls += 1
+        text = self._answer(contents)
+        chunk = max(1, len(text) // 8)
+        first = True
+        for i in range(0, len(text), chunk):
+            if first:
+                self._owner.first_token_latency.sleep()
+                first = False
+            else:
+                eventlet.sleep(self._owner.latency.ms / 8000.0)
+            yield _GenaiResponse(text[i:i + chunk])
+
+
+class FakeGenai:
+    """google.genai.Client(api_key=...) stand-in."""
+
+    def __init__(self, latency_ms=1500.0, jitter_ms=300.0, first_token_ms=None, seed=1):
+        self.latency = Latency(latency_ms, jitter_ms, seed)
+        self.first_token_latency = Latency(first_token_ms if first_token_ms is not None else latency_ms / 4, 0, seed)
+        self.calls = 0
+        self.models = _FakeModels(self)
+
+
+# --- Roboflow ---
+
+class FakeRoboflow:
+    """inference_sdk.InferenceHTTPClient stand-in; the label depends on the image bytes."""
+
+    LABELS = ("mold", "leak", "crack", "pest", "electrical")
+
+    def __init__(self, api_url=None, api_key=None, latency_ms=400.0, jitter_ms=100.0, seed=2):
+        self.latency = Latency(latency_ms, jitter_ms, seed)
+        self.calls = 0
+
+    def infer(self, inference_input, model_id=None):
+        self.calls += 1
+        self.latency.sleep()
+        label = self.LABELS[zlib.crc32(inference_input[-64:].encode()) % len(self.LABELS)]
+        return {"predictions": [{"class": label, "confidence": 0.91}], "top": label}
+
+
+# --- Identity Toolkit ---
+
+class _Response:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeIdentityToolkit:
+    """requests.Session stand-in for accounts:signInWithPassword. users: email -> (uid, password)."""
+
+    def __init__(self, users, latency_ms=150.0, jitter_ms=30.0, seed=3):
+        self.users = users
+        self.latency = Latency(latency_ms, jitter_ms, seed)
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None, **kwargs):
+        self.calls += 1
+        self.latency.sleep()
+        entry = self.users.get((json or {}).get("email"))
+        if entry is None or entry[1] != json.get("password"):
+            return _Response(400, {"error": {"message": "INVALID_LOGIN_CREDENTIALS"}})
+        return _Response(200, {"localId": entry[0], "idToken": f"bench:{entry[0]}", "refreshToken": "r"})
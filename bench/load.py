@@ -0,0 +1,481 @@
+"""
+Load-test the whole app against local fakes.
+
+Boots api.index (Flask + Socket.IO, eventlet) in a child process with every
+external service replaced by bench/fakes.py (Firestore, Gemini, Roboflow,
+Identity Toolkit) and bench/smtp_sink.py (SMTP), seeds a fixed data set, and
+drives these scenarios:
+
+    login               password logins from many distinct users
+    login_token         ID-token logins (/login/token)
+    landlord_dashboard  landlords with --tenants tenants each reloading the dashboard
+    chat                --rooms rooms x --senders concurrent Socket.IO senders
+    upload              image upload bursts (--images distinct images)
+    accept              tenants accepting landlord invitations (--invites each)
+
+For each it reports p50/p95/p99/mean latency, requests/sec, errors and
+Firestore RPCs per request (plus how many workers ran out of work early,
+e.g. accept workers whose invitations were all used), and saves the run to bench/results/<git sha>.json
+so runs on different commits can be compared:
+
+    python bench/load.py
+    python bench/load.py --scenarios landlord_dashboard --tenants 500 --firestore-ms 40
+    python bench/load.py --compare bench/results/<older sha>.json
+
+Fixtures, fake latencies and the random seed are recorded with the results;
+only compare runs made with the same parameters.
+"""
+import os
+import sys
+import io
+import json
+import time
+import random
+import socket
+import argparse
+import datetime
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+PASSWORD = "bench-password"
+SCENARIOS = ("login", "login_token", "landlord_dashboard", "chat", "upload", "accept")
+
+
+def landlord_uid(i):
+    return f"landlord-{i}"
+
+
+def tenant_uid(i, j):
+    return f"tenant-{i}-{j}"
+
+
+def email_of(uid):
+    return f"{uid}@bench.test"
+
+
+def invite_id(tuid, k):
+    return f"invite-{tuid}-{k}"
+
+
+# --- server side (child process) ---
+
+def seed_fixtures(db, landlords, tenants, issues, invites=0, invited_tenants=0):
+    """
+    users, landlord->tenants links and issues; deterministic for a given size.
+    The first `invited_tenants` tenants of landlord-0 also get `invites`
+    pending invitations, alternating between the other landlords.
+    """
+    rand = random.Random(0)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    labels = ("mold", "leak", "crack", "pest", "electrical")
+    users = {}
+    for i in range(landlords):
+        luid = landlord_uid(i)
+        users[email_of(luid)] = (luid, PASSWORD)
+        db.seed(f"users/{luid}", {"email": email_of(luid), "role": "landlord", "username": luid})
+        for j in range(tenants):
+            tuid = tenant_uid(i, j)
+            users[email_of(tuid)] = (tuid, PASSWORD)
+            db.seed(f"users/{tuid}", {"email": email_of(tuid), "role": "tenant", "username": tuid,
+                                      "state": "California", "landlord": email_of(luid), "landlord_uid": luid})
+            db.seed(f"users/{luid}/tenants/{tuid}", {"email": email_of(tuid), "attached_at": now})
+            for k in range(issues):
+                db.seed(f"issues/{tuid}-{k}", {
+                    "label": rand.choice(labels), "tenant": tuid, "landlord_uid": luid,
+                    "status": rand.choice(("pending", "pending", "resolved")),
+                    "ai_advice": "Dear Landlord, ...", "days": 14,
+                    "created_at": now - datetime.timedelta(hours=rand.randint(1, 2000)),
+                })
+    for j in range(min(invited_tenants, tenants) if landlords else 0):
+        tuid = tenant_uid(0, j)
+        for k in range(invites):
+            luid = landlord_uid(1 + k % (landlords - 1)) if landlords > 1 else landlord_uid(0)
+            db.seed(f"requests/{invite_id(tuid, k)}", {
+                "tenant_email": email_of(tuid), "landlord_email": email_of(luid), "landlord_uid": luid,
+                "status": "pending", "timestamp": now - datetime.timedelta(minutes=invites - k),
+            })
+    return users
+
+
+def serve(port, opts):
+    import eventlet
+    eventlet.monkey_patch()
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, "bench"))
+    import fakes
+    from smtp_sink import SMTPSink
+
+    db = fakes.FakeFirestore(opts["firestore_ms"], opts["firestore_ms"] / 5)
+    genai_client = fakes.FakeGenai(opts["gemini_ms"], opts["gemini_ms"] / 5)
+    users = seed_fixtures(db, opts["landlords"], opts["tenants"], opts["issues"],
+                          opts.get("invites", 0), opts.get("invited_tenants", 0))
+    sink = SMTPSink(port=0, latency=opts["smtp_ms"] / 1000.0).start()
+    roboflow_ms = opts["roboflow_ms"]
+
+    os.environ.update({
+        "FIREBASE_WEB_API_KEY": "bench",
+        "FIREBASE_PROJECT_ID": "bench",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(sink.port),
+        "SMTP_STARTTLS": "0",
+        "GMAIL_USER": "",
+        "CLASSIFIER_BACKEND": "remote",
+        "METRICS_TOKEN": "bench",
+    })
+
+    # Install the fakes in the client registry before api.index looks anything up
+    from firebase_admin import auth as admin_auth
+    from api import clients
+    clients.provide("firebase_app", None)  # None = the default app; auth calls are faked below
+    clients.provide("firestore", db)
+    clients.provide("genai", genai_client)
+    clients.provide("roboflow", fakes.FakeRoboflow(latency_ms=roboflow_ms, jitter_ms=roboflow_ms / 5))
+
+    def verify_id_token(token, **kwargs):
+        uid = token.split(":", 1)[1] if token.startswith("bench:") else None
+        if email_of(uid) not in users:
+            raise admin_auth.InvalidIdTokenError("unknown bench token")
+        return {"uid": uid, "email": email_of(uid), "auth_time": time.time()}
+
+    admin_auth.verify_id_token = verify_id_token
+
+    from api import index, auth, summaries
+    auth._http = fakes.FakeIdentityToolkit(users, opts["auth_ms"], opts["auth_ms"] / 5)
+    summaries.rebuild(db)  # as after `python -m api.summaries rebuild` on a real deployment
+    db.rpcs.clear()
+
+    @index.app.get("/_bench")
+    def _bench():
+        return {"firestore_rpcs": dict(db.rpcs), "firestore_total": sum(db.rpcs.values()),
+                "gemini_calls": genai_client.calls, "smtp_messages": len(sink.messages)}
+
+    index.socketio.run(index.app, host="127.0.0.1", port=port, log_output=False)
+
+
+# --- driver side ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"app did not start on port {port}")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def summarize(latencies, errors, elapsed, rpcs, exhausted=0):
+    values = sorted(latencies)
+    count = len(values) + errors
+    return {
+        "requests": count,
+        "errors": errors,
+        "exhausted": exhausted,
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 0.50), 1) if values else None,
+        "p95_ms": round(percentile(values, 0.95), 1) if values else None,
+        "p99_ms": round(percentile(values, 0.99), 1) if values else None,
+        "mean_ms": round(sum(values) / len(values), 1) if values else None,
+        "firestore_rpcs_per_req": round(rpcs / count, 2) if count else None,
+    }
+
+
+class App:
+    def __init__(self, base):
+        import requests
+        self.requests = requests
+        self.base = base
+
+    def session(self):
+        return self.requests.Session()
+
+    def login(self, uid):
+        s = self.session()
+        r = s.post(f"{self.base}/login", data={"username": email_of(uid), "password": PASSWORD},
+                   allow_redirects=False, timeout=30)
+        if r.status_code != 302:
+            raise RuntimeError(f"login failed for {uid}: {r.status_code}")
+        return s
+
+    def bench_stats(self):
+        return self.requests.get(f"{self.base}/_bench", timeout=10).json()
+
+
+class Exhausted(Exception):
+    """Raised by a scenario's call() when its worker has nothing left to do; the worker stops."""
+
+
+def run_http(app, setup, call, concurrency, duration):
+    """concurrency workers each run setup(worker) once, then call(state) until duration is up."""
+    latencies, errors, exhausted = [], [0], [0]
+    lock = threading.Lock()
+    states = [setup(w) for w in range(concurrency)]
+    rpcs_before = app.bench_stats()["firestore_total"]
+    stop_at = time.time() + duration
+
+    def worker(state):
+        local, failed, done = [], 0, 0
+        while time.time() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                ok = call(state)
+            except Exhausted:
+                done = 1
+                break
+            except Exception:
+                ok = False
+            if ok:
+                local.append((time.perf_counter() - t0) * 1000)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+            exhausted[0] += done
+
+    t0 = time.time()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, states))
+    elapsed = time.time() - t0
+    rpcs = app.bench_stats()["firestore_total"] - rpcs_before
+    return summarize(latencies, errors[0], elapsed, rpcs, exhausted[0])
+
+
+def scenario_login(app, args):
+    rand = random.Random(1)
+
+    def call(_):
+        i, j = rand.randrange(args.landlords), rand.randrange(args.tenants)
+        uid = tenant_uid(i, j) if rand.random() < 0.9 else landlord_uid(i)
+        r = app.session().post(f"{app.base}/login", data={"username": email_of(uid), "password": PASSWORD},
+                               allow_redirects=False, timeout=30)
+        return r.status_code == 302
+
+    return run_http(app, lambda w: None, call, args.concurrency, args.duration)
+
+
+def scenario_login_token(app, args):
+    rand = random.Random(2)
+
+    def call(_):
+        uid = tenant_uid(rand.randrange(args.landlords), rand.randrange(args.tenants))
+        r = app.session().post(f"{app.base}/login/token", json={"id_token": f"bench:{uid}"}, timeout=30)
+        return r.status_code == 200 and r.json().get("success")
+
+    return run_http(app, lambda w: None, call, args.concurrency, args.duration)
+
+
+def scenario_landlord_dashboard(app, args):
+    def call(session):
+        return session.get(f"{app.base}/landlord/dashboard", timeout=60).status_code == 200
+
+    return run_http(app, lambda w: app.login(landlord_uid(w % args.landlords)), call,
+                    args.concurrency, args.duration)
+
+
+def scenario_upload(app, args):
+    from PIL import Image
+    rand = random.Random(3)
+    images = []
+    for n in range(args.images):
+        img = Image.effect_noise((1600, 1200), 40 + n % 60).convert("RGB")
+        img = Image.merge("RGB", [band.point(lambda v, s=rand.randint(0, 80): min(255, v + s)) for band in img.split()])
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=90)
+        images.append(buf.getvalue())
+
+    def call(session):
+        data = rand.choice(images)
+        r = session.post(f"{app.base}/upload_image", files={"file": ("photo.jpg", data, "image/jpeg")}, timeout=60)
+        return r.status_code == 200 and r.json().get("success")
+
+    return run_http(app, lambda w: app.session(), call, args.concurrency, args.duration)
+
+
+def scenario_chat(app, args):
+    import socketio
+
+    rtts, lock = [], threading.Lock()
+    received = [0]
+    clients = []
+    done = threading.Event()
+    expected = args.rooms * args.senders * args.messages
+    rpcs_before = app.bench_stats()["firestore_total"]
+
+    for r in range(args.rooms):
+        for s in range(args.senders):
+            sio = socketio.Client(reconnection=False)
+            me = f"r{r}s{s}"
+
+            def on_message(data, me=me):
+                with lock:
+                    received[0] += 1
+                    if data.get("sender") == me:
+                        rtts.append((time.time() - float(data["message"])) * 1000)
+                        if len(rtts) >= expected:
+                            done.set()
+
+            sio.on("chat_message", on_message)
+            sio.connect(app.base, transports=["websocket"])
+            sio.emit("join_chat", {"chat_id": f"bench-room-{r}"})
+            clients.append((sio, me, f"bench-room-{r}"))
+    time.sleep(1.0)
+    with lock:
+        received[0] = 0
+
+    def sender(client):
+        sio, me, room = client
+        for _ in range(args.messages):
+            sio.emit("send_chat_message", {"chat_id": room, "sender": me, "message": repr(time.time()), "type": "text"})
+            time.sleep(args.message_interval)
+
+    t0 = time.time()
+    with ThreadPoolExecutor(len(clients)) as pool:
+        list(pool.map(sender, clients))
+    done.wait(timeout=60)
+    elapsed = time.time() - t0
+    for sio, _, _ in clients:
+        sio.disconnect()
+
+    summary = summarize(rtts, expected - len(rtts), elapsed, app.bench_stats()["firestore_total"] - rpcs_before)
+    summary["deliveries_per_sec"] = round(received[0] / elapsed, 1)
+    return summary
+
+
+def scenario_accept(app, args):
+    def setup(w):
+        return {"session": app.login(tenant_uid(0, w)), "uid": tenant_uid(0, w), "next": 0}
+
+    def call(state):
+        if state["next"] >= args.invites:
+            raise Exhausted()
+        rid = invite_id(state["uid"], state["next"])
+        state["next"] += 1
+        r = state["session"].get(f"{app.base}/accept-request/{rid}", allow_redirects=False, timeout=60)
+        return r.status_code == 302
+
+    return run_http(app, setup, call, min(args.concurrency, args.tenants), args.duration)
+
+
+RUNNERS = {
+    "login": scenario_login,
+    "login_token": scenario_login_token,
+    "landlord_dashboard": scenario_landlord_dashboard,
+    "chat": scenario_chat,
+    "upload": scenario_upload,
+    "accept": scenario_accept,
+}
+
+
+def git_sha():
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "api", "templates"], cwd=ROOT) != 0
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(results, baseline=None):
+    print(f"\n{'scenario':<20} {'reqs':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'fs/req':>7}")
+    for name, r in results.items():
+        def fmt(v):
+            return f"{v:.1f}" if isinstance(v, (int, float)) else "-"
+        print(f"{name:<20} {r['requests']:>6} {r['errors']:>4} {fmt(r['rps']):>8} {fmt(r['p50_ms']):>8} "
+              f"{fmt(r['p95_ms']):>8} {fmt(r['p99_ms']):>8} {fmt(r['firestore_rpcs_per_req']):>7}")
+        old = (baseline or {}).get(name)
+        if old:
+            deltas = []
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                if old.get(key) and r.get(key) is not None:
+                    deltas.append(f"{key} {100.0 * (r[key] - old[key]) / old[key]:+.0f}%")
+            print(f"{'':<20} vs baseline: {', '.join(deltas)}")
+        if r.get("exhausted"):
+            print(f"{'':<20} {r['exhausted']} workers ran out of work before the end; use a larger fixture to compare")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--opts", help=argparse.SUPPRESS)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--landlords", type=int, default=5)
+    parser.add_argument("--tenants", type=int, default=200, help="tenants per landlord")
+    parser.add_argument("--issues", type=int, default=3, help="issues per tenant")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--senders", type=int, default=5, help="concurrent senders per room")
+    parser.add_argument("--messages", type=int, default=50, help="messages per sender")
+    parser.add_argument("--message-interval", type=float, default=0.01)
+    parser.add_argument("--images", type=int, default=20, help="distinct images in the upload mix")
+    parser.add_argument("--invites", type=int, help="pending invitations per accepting tenant "
+                        "(default: 25 per second of --duration, more than one worker can accept)")
+    parser.add_argument("--firestore-ms", type=float, default=20.0)
+    parser.add_argument("--gemini-ms", type=float, default=1500.0)
+    parser.add_argument("--roboflow-ms", type=float, default=400.0)
+    parser.add_argument("--auth-ms", type=float, default=150.0)
+    parser.add_argument("--smtp-ms", type=float, default=5.0)
+    parser.add_argument("--compare", help="results JSON from another run to diff against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, json.loads(args.opts))
+    if args.invites is None:
+        args.invites = int(args.duration * 25) + 1
+
+    opts = {k: getattr(args, k) for k in ("landlords", "tenants", "issues", "firestore_ms", "gemini_ms",
+                                          "roboflow_ms", "auth_ms", "smtp_ms")}
+    if "accept" in args.scenarios.split(","):
+        opts.update(invites=args.invites, invited_tenants=args.concurrency)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port), "--opts", json.dumps(opts)],
+                              cwd=ROOT, stdout=subprocess.DEVNULL)
+    results = {}
+    try:
+        wait_for_port(port)
+        app = App(f"http://127.0.0.1:{port}")
+        for name in args.scenarios.split(","):
+            print(f"running {name} ...", flush=True)
+            results[name] = RUNNERS[name](app, args)
+        server_stats = app.requests.get(f"{app.base}/_stats", headers={"Authorization": "Bearer bench"}, timeout=10).json()
+    finally:
+        server.terminate()
+        server.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+    print_table(results, baseline)
+
+    if not args.no_save:
+        sha = git_sha()
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{sha}.json")
+        params = {k: v for k, v in vars(args).items() if k not in ("serve", "opts", "compare", "no_save")}
+        with open(path, "w") as f:
+            json.dump({"git_sha": sha, "run_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "params": params, "scenarios": results, "server_stats": server_stats}, f, indent=2)
+        print(f"\nsaved {os.path.relpath(path, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Minimal debug SMTP server: accepts every message and keeps it in memory.
+
+    python bench/smtp_sink.py --port 1025 [--print]
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_STARTTLS=0 GMAIL_USER= python -m api.index
+
+Also importable: SMTPSink(port).start() runs it on a background thread and
+exposes .messages / .connections for assertions and benchmarks.
+"""
+import time
+import argparse
+import threading
+import socketserver
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connections += 1
+        self.reply("220 smtp-sink ready")
+        mail_from, rcpts = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip()
+            verb = cmd[:4].upper()
+            if sink.latency:
+                time.sleep(sink.latency)
+            if verb in ("HELO", "EHLO"):
+                self.reply("250 smtp-sink")
+            elif verb == "MAIL":
+                mail_from, rcpts = cmd[10:].strip("<> "), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpts.append(cmd[8:].strip("<> "))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    body.append(data.decode(errors="replace"))
+                sink.record(mail_from, rcpts, "".join(body))
+                self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SMTPSink:
+    def __init__(self, host="127.0.0.1", port=1025, latency=0.0, echo=False):
+        self.messages = []
+        self.connections = 0
+        self.latency = latency  # seconds added to every command, to mimic a remote server
+        self.echo = echo
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+
+    def record(self, mail_from, rcpts, body):
+        with self._lock:
+            self.messages.append((mail_from, rcpts, body))
+        if self.echo:
+            print(f"--- from {mail_from} to {', '.join(rcpts)}\n{body}")
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Debug SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--print", dest="echo", action="store_true")
+    args = parser.parse_args()
+    sink = SMTPSink(args.host, args.port, args.latency, args.echo)
+    print(f"smtp-sink listening on {args.host}:{sink.port}")
+    sink.server.serve_forever()
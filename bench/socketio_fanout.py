@@ -0,0 +1,165 @@
+"""
+Socket.IO broadcast fan-out across workers.
+
+Starts the local broker (api/broker.py) and 1..N worker processes that share
+it through SOCKETIO_MESSAGE_QUEUE=ipc://..., connects clients spread
+round-robin over the workers, and has one sender per room emit messages.
+Reports delivered messages/sec for each worker count.
+
+    python bench/socketio_fanout.py --workers 1,2,4 --clients 200 --rooms 10 --messages 100
+
+Workers run a minimal app with the same join_chat / send_chat_message ->
+chat_message contract as api/index.py (no Firestore), so the numbers isolate
+Socket.IO + message-queue fan-out.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"port {port} did not open")
+
+
+def serve_worker(port, queue_url):
+    import eventlet
+    eventlet.monkey_patch()
+    sys.path.insert(0, ROOT)
+    from flask import Flask
+    from flask_socketio import SocketIO, join_room, emit
+    from api.broker import socketio_queue_options
+
+    app = Flask(__name__)
+    sio = SocketIO(app, async_mode="eventlet", **socketio_queue_options(queue_url))
+
+    @sio.on("join_chat")
+    def join_chat(data):
+        join_room(data["chat_id"])
+
+    @sio.on("send_chat_message")
+    def send_chat_message(data):
+        emit("chat_message", data, room=data["chat_id"])
+
+    sio.run(app, host="127.0.0.1", port=port, log_output=False)
+
+
+def client_proc(ports, client_ids, rooms, messages, ready, go, results):
+    import socketio
+
+    received = [0]
+    last = [0.0]
+    clients = []
+    for cid in client_ids:
+        sio = socketio.Client(reconnection=False)
+
+        @sio.on("chat_message")
+        def on_message(data):
+            received[0] += 1
+            last[0] = time.time()
+
+        sio.connect(f"http://127.0.0.1:{ports[cid % len(ports)]}", transports=["websocket"])
+        room = f"room-{cid % rooms}"
+        sio.emit("join_chat", {"chat_id": room})
+        clients.append((cid, sio, room))
+
+    time.sleep(1.0)  # let joins propagate through the broker
+    ready.put(len(client_ids))
+    go.wait()
+
+    for cid, sio, room in clients:
+        if cid < rooms:  # first client of every room is its sender
+            for i in range(messages):
+                sio.emit("send_chat_message", {"chat_id": room, "sender": f"c{cid}", "message": f"m{i}", "type": "text"})
+
+    expected = len(client_ids) * messages
+    deadline = time.time() + 60
+    while received[0] < expected and time.time() < deadline:
+        time.sleep(0.05)
+    results.put((received[0], expected, last[0]))
+    for _, sio, _ in clients:
+        sio.disconnect()
+
+
+def run(workers, clients, rooms, messages, procs):
+    broker_port = free_port()
+    queue_url = f"ipc://127.0.0.1:{broker_port}"
+    children = [subprocess.Popen([sys.executable, "-m", "api.broker", "--port", str(broker_port)],
+                                 cwd=ROOT, stdout=subprocess.DEVNULL)]
+    try:
+        wait_for_port(broker_port)
+        ports = [free_port() for _ in range(workers)]
+        for port in ports:
+            children.append(subprocess.Popen([sys.executable, __file__, "--serve", str(port), "--queue", queue_url],
+                                             cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for port in ports:
+            wait_for_port(port)
+
+        ctx = mp.get_context("spawn")
+        ready, results, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+        drivers = [ctx.Process(target=client_proc,
+                               args=(ports, list(range(p, clients, procs)), rooms, messages, ready, go, results))
+                   for p in range(procs)]
+        for d in drivers:
+            d.start()
+        for _ in drivers:
+            ready.get(timeout=120)
+        t0 = time.time()
+        go.set()
+        got = [results.get(timeout=120) for _ in drivers]
+        for d in drivers:
+            d.join()
+    finally:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait()
+
+    delivered = sum(r[0] for r in got)
+    expected = sum(r[1] for r in got)
+    elapsed = max(r[2] for r in got) - t0
+    return delivered, expected, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--queue", help=argparse.SUPPRESS)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=100, help="messages sent per room")
+    parser.add_argument("--client-procs", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve_worker(args.serve, args.queue)
+
+    print(f"{args.clients} clients, {args.rooms} rooms, {args.messages} msgs/room\n")
+    print(f"{'workers':>7} {'delivered':>10} {'seconds':>8} {'msgs/s':>9}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        delivered, expected, elapsed = run(workers, args.clients, args.rooms, args.messages, args.client_procs)
+        note = "" if delivered == expected else f"  (expected {expected})"
+        print(f"{workers:>7} {delivered:>10} {elapsed:>8.2f} {delivered / elapsed:>9.0f}{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Cold-start cost of the app: importing api.index and serving its first request.
+
+Each run is a fresh interpreter with default settings and no credentials
+(nothing should need them until a request does). It reports
+
+    import ms          `import api.index`: monkey_patch, Flask app, blueprints
+    first request ms   app.test_client().get("/_ping")
+    clients built      clients import, the request or threads started on import
+                       built or tried to build (checked after yielding to the
+                       hub); should be none (api/clients.py)
+    heavy modules      google.genai, inference_sdk, docx, PIL if import pulled them in
+
+then a `-X importtime` breakdown of one more run: self time summed per
+top-level package, slowest first. Exits 1 if the median import + first
+request exceeds --budget-ms or if any client was built.
+
+    python bench/startup.py
+    python bench/startup.py --runs 10 --top 25 --budget-ms 2000
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("google.genai", "inference_sdk", "docx", "PIL")
+
+CHILD = f"""
+import sys, json, time
+t0 = time.perf_counter()
+import api.index as index
+t1 = time.perf_counter()
+status = index.app.test_client().get("/_ping").status_code
+t2 = time.perf_counter()
+import eventlet
+eventlet.sleep(0.2)
+print(json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "first_request_ms": (t2 - t1) * 1000,
+    "status": status,
+    "built": index.clients.stats()["requested"],
+    "heavy": [m for m in {HEAVY!r} if m in sys.modules],
+}}))
+"""
+
+
+def _env():
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    for key in ("FIREBASE_SERVICE_ACCOUNT_JSON", "GEMINI_API_KEY", "ROBOFLOW_API_KEY"):
+        env.pop(key, None)
+    return env
+
+
+def run_once(importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD]
+    proc = subprocess.run(cmd, cwd=ROOT, env=_env(), capture_output=True, text=True)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode or not lines:
+        sys.exit(f"startup failed:\n{proc.stderr[-2000:]}")
+    return json.loads(lines[-1]), proc.stderr
+
+
+def by_package(stderr):
+    """Sum -X importtime self times (us) per top-level package."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        totals[name.strip().split(".")[0]] += int(self_us)
+    return sorted(totals.items(), key=lambda kv: -kv[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="packages to list in the importtime breakdown")
+    parser.add_argument("--budget-ms", type=float, default=1200, help="import + first request, median")
+    args = parser.parse_args()
+
+    runs = [run_once()[0] for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    first_ms = statistics.median(r["first_request_ms"] for r in runs)
+    total_ms = statistics.median(r["import_ms"] + r["first_request_ms"] for r in runs)
+    last = runs[-1]
+
+    print(f"{args.runs} cold starts (median)")
+    print(f"  import ms          {import_ms:>8.1f}")
+    print(f"  first request ms   {first_ms:>8.1f}   (/_ping -> {last['status']})")
+    print(f"  total ms           {total_ms:>8.1f}   budget {args.budget_ms:g}")
+    print(f"  clients built      {', '.join(last['built']) or 'none'}")
+    print(f"  heavy modules      {', '.join(last['heavy']) or 'none'}")
+
+    _, stderr = run_once(importtime=True)
+    packages = by_package(stderr)
+    print(f"\n-X importtime, self time per package ({sum(us for _, us in packages) / 1000:.0f}ms total)")
+    for name, us in packages[:args.top]:
+        print(f"  {name:<28} {us / 1000:>8.1f} ms")
+
+    failed = False
+    if total_ms > args.budget_ms:
+        print(f"\nover budget by {total_ms - args.budget_ms:.0f}ms")
+        failed = True
+    if any(r["built"] for r in runs):
+        print("\nclients were built at startup; they should wait for a request")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()